@@ -1,7 +1,7 @@
 # api/admin.py
 
 from django.contrib import admin
-from .models import User, Activity, ActivityFile, TimeSlot, Enrollment
+from .models import User, Activity, ActivityFile, TimeSlot, Enrollment, Event, ArchivedTimeSlot, ArchivedEnrollment, ActivityStats
 from django.contrib.auth.admin import UserAdmin
 
 
@@ -30,4 +30,8 @@ admin.site.register(User, CustomUserAdmin)
 admin.site.register(Activity)
 admin.site.register(ActivityFile)
 admin.site.register(TimeSlot)
-admin.site.register(Enrollment)
\ No newline at end of file
+admin.site.register(Enrollment)
+admin.site.register(Event)
+admin.site.register(ArchivedTimeSlot)
+admin.site.register(ArchivedEnrollment)
+admin.site.register(ActivityStats)
\ No newline at end of file
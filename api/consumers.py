@@ -1,17 +1,36 @@
 # api/consumers.py
-import json
 import asyncio
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .models import TimeSlot, Enrollment, User
+from .models import TimeSlot, Enrollment, Event
 from asgiref.sync import sync_to_async
-from django.utils import timezone
+from django.conf import settings
+from . import room_cache
+from . import fanout
+from . import protocol
+from . import events
 
 class WaitingRoomConsumer(AsyncWebsocketConsumer):
     """
     Gestiona la sala de espera de una convocatoria (TimeSlot).
+
+    Cada conexión tiene:
+    - Un 'ping' periódico; si el cliente no da señales de vida, se le desconecta.
+    - Un límite de mensajes entrantes (token bucket).
+    - Una cola de salida acotada; si el cliente no la vacía, se le desconecta.
     """
 
     async def connect(self):
+        self.reaped = False
+        self.last_seen = time.monotonic()
+        self.tokens = settings.WAITING_ROOM_INBOUND_BURST
+        self.tokens_at = self.last_seen
+        self.outbox = asyncio.Queue(maxsize=settings.WAITING_ROOM_MAX_PENDING_SENDS)
+        self.writer_task = None
+        self.heartbeat_task = None
+        self.countdown_task = None
+
+
         # Obtenemos el ID de la convocatoria desde la URL
         self.room_id = self.scope['url_route']['kwargs']['timeslot_id']
         self.room_group_name = f'waiting_room_{self.room_id}'
@@ -21,118 +40,245 @@ class WaitingRoomConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        # Si el cliente pide el subprotocolo binario, lo aceptamos.
+        # Si no, seguimos con JSON.
+        self.use_msgpack = protocol.MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        if self.use_msgpack:
+            await self.accept(subprotocol=protocol.MSGPACK_SUBPROTOCOL)
+        else:
+            await self.accept()
 
-        # TODO: Autenticar al usuario
-        # Por ahora, nos conectamos anónimamente.
+        # El usuario lo pone JWTAuthMiddleware (?token=) o la sesión de Django.
+        # Los anónimos también entran en el reparto (por su canal).
+        user = self.scope.get('user')
+        self.user_id = user.id if user is not None and user.is_authenticated else None
+        # El reparto de la llamada se hace con los que están conectados, no con todos los inscritos
+        await room_cache.mark_present(self.room_id, self.channel_name, self.user_id)
 
         print(f"Usuario conectado a la sala {self.room_id}")
+        await room_cache.incr_connection_stat('connected')
+        await events.aemit(
+            Event.JOINED_ROOM,
+            user_id=self.user_id,
+            timeslot_id=int(self.room_id)
+        )
+
+        self.writer_task = asyncio.create_task(self.writer())
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
 
         # Enviar mensaje de bienvenida
-        await self.send(text_data=json.dumps({
-            'type': 'connection_established',
-            'message': f'¡Conectado a la sala de espera {self.room_id}!'
-        }))
+        await self.send_event(
+            'connection_established',
+            room_id=int(self.room_id),
+            message=f'¡Conectado a la sala de espera {self.room_id}!'
+        )
 
     async def disconnect(self, close_code):
-        # Salir del grupo de la sala
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        for task in (self.writer_task, self.heartbeat_task):
+            if task is not None:
+                task.cancel()
+
+        # Salir del grupo de la sala (si no lo hicimos ya al desconectarle)
+        if not self.reaped:
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
+            await room_cache.mark_absent(self.room_id, self.channel_name)
+        await room_cache.incr_connection_stat('disconnected')
         print(f"Usuario desconectado de la sala {self.room_id}")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         # Esta función se activa cuando el cliente envía un mensaje
-        data = json.loads(text_data)
+        self.last_seen = time.monotonic()
+
+        if not self.allow_inbound(text_data, bytes_data):
+            await room_cache.incr_connection_stat('rate_limited')
+            return
+
+        data = protocol.decode_client_message(text_data, bytes_data)
+        if data is None:
+            await room_cache.incr_connection_stat('malformed')
+            return
         message_type = data.get('type')
 
         if message_type == 'user_joined':
             # Un usuario (probablemente el primero) inicia la cuenta atrás
             # O podríamos iniciarla en `connect` si es el primer usuario.
-            # Esta lógica la refinaremos, por ahora solo retransmitimos.
-            await self.start_countdown()
+            # La cuenta atrás va en su propia tarea para no bloquear este consumer.
+            # Guardamos la referencia: si no, el recolector de basura podría llevársela.
+            if self.countdown_task is None or self.countdown_task.done():
+                self.countdown_task = asyncio.create_task(self.start_countdown())
+                self.countdown_task.add_done_callback(self.countdown_done)
 
     async def start_countdown(self):
         # Esta es la lógica central. 
         # El primer usuario en entrar podría disparar esto.
 
-        # TODO: Evitar que esto se dispare varias veces.
+        # Tiempo de espera (configurable en settings)
+        WAIT_SECONDS = settings.WAITING_ROOM_WAIT_SECONDS
+
+        # Solo una cuenta atrás por sala, aunque varios usuarios (o workers) la pidan.
+        if not await room_cache.acquire_countdown_lock(self.room_id, WAIT_SECONDS + 60):
+            return
 
         print(f"Iniciando cuenta atrás para la sala {self.room_id}...")
 
-        # Simulamos el tiempo de espera (configurable en el requisito)
-        # Por ahora, 10 segundos para la prueba.
-        WAIT_SECONDS = 10 
+        try:
+            for i in range(WAIT_SECONDS, 0, -1):
+                await self.channel_layer.group_send(
+                    self.room_group_name,
+                    {
+                        'type': 'countdown_tick',
+                        'time_left': i
+                    }
+                )
+                await asyncio.sleep(1) # Espera 1 segundo
 
-        for i in range(WAIT_SECONDS, 0, -1):
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'countdown_tick',
-                    'time_left': i
-                }
-            )
-            await asyncio.sleep(1) # Espera 1 segundo
+            # ¡Tiempo agotado!
+            await self.launch_call()
+        except (Exception, asyncio.CancelledError):
+            # No dejamos la sala bloqueada hasta que caduque el lock
+            await room_cache.release_countdown_lock(self.room_id)
+            raise
 
-        # ¡Tiempo agotado!
-        await self.launch_call()
+    def countdown_done(self, task):
+        # Sin esto, un error en la cuenta atrás solo saldría (o no) al destruir la tarea
+        if not task.cancelled() and task.exception() is not None:
+            print(f"ERROR en la cuenta atrás de la sala {self.room_id}: {task.exception()!r}")
 
     async def launch_call(self):
         # Lógica de agrupación y lanzamiento de Jitsi
         print(f"¡Tiempo agotado para {self.room_id}! Lanzando llamadas.")
 
-        # 1. Obtener la convocatoria y el máximo de participantes
-        # Como estamos en un método async, necesitamos helpers sync_to_async
-        timeslot, max_participants = await self.get_timeslot_details()
+        # 1. Obtener el estado de la sala (máximo de participantes e inscritos).
+        # Si el cron de precarga ya la dejó en Redis, no tocamos la BBDD.
+        room = await self.get_room_state()
+        max_participants = room['max_participants']
 
-        # 2. Obtener los usuarios que SÍ se presentaron (los 'attended=True')
-        # (Por ahora, buscaremos a todos los inscritos)
-        enrollments = await self.get_enrollments()
+        # 2. Los que SÍ están en la sala (conexiones con señales de vida),
+        # primero los inscritos. Si agrupáramos a todos los inscritos, los
+        # pocos que se presentan podrían acabar cada uno en una sala distinta.
+        present = await room_cache.get_present(self.room_id, settings.WAITING_ROOM_IDLE_TIMEOUT_SECONDS)
+        participants = fanout.order_participants(
+            [fanout.participant_key(user_id, channel_name) for channel_name, user_id in present.items()],
+            room['user_ids'],
+        )
 
         # 3. Lógica de agrupación
-        # Esta es la lógica que se pidió: (ej. 5 usuarios, max 4 -> grupos de 3 y 2)
-        # Esta lógica es compleja Empecemos con algo simple:
-        # TODO: Implementar la lógica de agrupación compleja.
-
-        # Por ahora, solo creamos UNA sala de Jitsi para todos
-        jitsi_room_name = f'talkabout_{self.room_id}_{timezone.now().timestamp()}'
-        jitsi_url = f'https://meet.jit.si/{jitsi_room_name}'
+        # (ej. 5 usuarios, max 4 -> grupos de 3 y 2), una sala de Jitsi por grupo.
+        assignments = fanout.build_call_assignments(self.room_id, participants, max_participants)
 
-        # 4. Enviar la URL a todos en el grupo
+        # 4. Enviar el reparto a todos en el grupo con un único mensaje.
+        # Cada consumer se queda solo con su URL (ver `call_launched`).
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'call_launched',
-                'url': jitsi_url
+                **assignments
             }
         )
+        await events.aemit(
+            Event.CALL_LAUNCHED,
+            timeslot_id=int(self.room_id),
+            participants=len(participants),
+            rooms=len(assignments['rooms'])
+        )
+
+    async def send_event(self, event_type, **data):
+        # Encola un evento para el cliente en el formato negociado en `connect`
+        if self.reaped:
+            return
+        if self.use_msgpack:
+            frame = {'bytes_data': protocol.encode_msgpack(event_type, data)}
+        else:
+            frame = {'text_data': protocol.encode_json(event_type, data)}
+
+        try:
+            self.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            # El cliente no está leyendo: no dejamos que crezca la cola
+            await self.reap('slow_consumer')
+
+    # --- Control de la conexión ---
+
+    async def writer(self):
+        # Vacía la cola de salida hacia el socket, de uno en uno
+        while True:
+            frame = await self.outbox.get()
+            await self.send(**frame)
+
+    async def heartbeat(self):
+        # Envía 'ping' periódicamente y desconecta a los clientes inactivos
+        while not self.reaped:
+            await asyncio.sleep(settings.WAITING_ROOM_HEARTBEAT_SECONDS)
+            if time.monotonic() - self.last_seen > settings.WAITING_ROOM_IDLE_TIMEOUT_SECONDS:
+                await self.reap('idle')
+                return
+            await self.send_event('ping')
+            await room_cache.mark_present(self.room_id, self.channel_name, self.user_id)
+            await room_cache.incr_connection_stat('pings')
+
+    def allow_inbound(self, text_data, bytes_data):
+        # Token bucket: WAITING_ROOM_INBOUND_RATE mensajes/s con ráfagas de WAITING_ROOM_INBOUND_BURST
+        size = len(bytes_data) if bytes_data is not None else len(text_data or '')
+        if size > settings.WAITING_ROOM_MAX_MESSAGE_BYTES:
+            return False
+
+        now = time.monotonic()
+        self.tokens = min(
+            settings.WAITING_ROOM_INBOUND_BURST,
+            self.tokens + (now - self.tokens_at) * settings.WAITING_ROOM_INBOUND_RATE
+        )
+        self.tokens_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def reap(self, reason):
+        # Saca al cliente del grupo YA (para no seguir enviándole mensajes) y cierra el socket
+        if self.reaped:
+            return
+        self.reaped = True
+        await self.channel_layer.group_discard(
+            self.room_group_name,
+            self.channel_name
+        )
+        await room_cache.mark_absent(self.room_id, self.channel_name)
+        await room_cache.incr_connection_stat(f'reaped_{reason}')
+        print(f"Usuario de la sala {self.room_id} desconectado por '{reason}'")
+        await self.close(code=4000)
 
     # --- Funciones de Ayuda (para hablar con la BBDD) ---
 
-    @sync_to_async
-    def get_timeslot_details(self):
-        slot = TimeSlot.objects.get(id=self.room_id)
-        return slot, slot.activity.max_participants
+    async def get_room_state(self):
+        # Primero Redis (precargado por PrewarmWaitingRoomsCronJob),
+        # y solo si no está, la BBDD.
+        room = await room_cache.load_room_state(self.room_id)
+        if room is None:
+            room = await self.load_room_state_from_db()
+        return room
 
     @sync_to_async
-    def get_enrollments(self):
+    def load_room_state_from_db(self):
+        slot = TimeSlot.objects.select_related('activity').get(id=self.room_id)
         # Idealmente, aquí filtraríamos por `attended=True`
-        return list(Enrollment.objects.filter(timeslot_id=self.room_id))
+        user_ids = Enrollment.objects.filter(timeslot_id=self.room_id).values_list('user_id', flat=True)
+        return room_cache.build_room_state(slot, list(user_ids))
 
 
     # --- Controladores de Mensajes del Grupo ---
 
     async def countdown_tick(self, event):
         # Enviar el "tick" de la cuenta atrás al cliente
-        await self.send(text_data=json.dumps({
-            'type': 'countdown',
-            'time_left': event['time_left']
-        }))
+        await self.send_event('countdown', time_left=event['time_left'])
 
     async def call_launched(self, event):
-        # Enviar la URL de la llamada al cliente
-        await self.send(text_data=json.dumps({
-            'type': 'redirect',
-            'url': event['url']
-        }))
\ No newline at end of file
+        # Buscamos la sala que le toca a esta conexión y le enviamos su URL
+        url = fanout.resolve_call_url(event, fanout.participant_key(self.user_id, self.channel_name))
+        if url is None:
+            # Llegó después del reparto: hueco libre por orden de llegada
+            position = await room_cache.next_arrival(self.room_id, event['launch_id'])
+            url = fanout.assign_by_arrival(event, position)
+        await self.send_event('redirect', url=url)
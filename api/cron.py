@@ -5,13 +5,25 @@ from django.utils import timezone
 from django.core.mail import send_mail
 from datetime import timedelta
 from django.conf import settings
+from django.db.models.functions import Mod
 
-from .models import TimeSlot, Enrollment
+from .models import TimeSlot, Enrollment, Event
+from . import room_cache
+from . import events
+from .locks import advisory_lock
+from .stats import refresh_stats
+from . import notifications
 
 class SendReminderCronJob(CronJobBase):
     """
     Este Cron Job se ejecuta periódicamente (ej. cada 10 min) 
     y envía recordatorios por email.
+
+    Si varios nodos ejecutan `runcrons`, un advisory lock de PostgreSQL
+    asegura que solo uno procesa cada shard a la vez, y cada convocatoria
+    se reclama con un UPDATE condicional de `reminder_sent`, así que nunca
+    se envían dos veces sus recordatorios.
+    Con REMINDER_CRON_SHARDS > 1, cada nodo procesa solo su partición.
     """
 
     # Configura cada cuánto queremos que se ejecute este job
@@ -21,6 +33,16 @@ class SendReminderCronJob(CronJobBase):
     code = 'api.send_reminder_cron_job'    # Un nombre único
 
     def do(self):
+        shards = settings.REMINDER_CRON_SHARDS
+        shard_index = settings.REMINDER_CRON_SHARD_INDEX
+
+        with advisory_lock(self.code, shard_index) as acquired:
+            if not acquired:
+                print(f"--- Cron Job: El shard {shard_index} ya lo está ejecutando otro nodo. Saltando. ---")
+                return
+            self.send_reminders(shards, shard_index)
+
+    def send_reminders(self, shards, shard_index):
         # 1. Obtenemos la hora actual en UTC
         now = timezone.now()
 
@@ -39,28 +61,41 @@ class SendReminderCronJob(CronJobBase):
         #    Y que no hayamos enviado ya un recordatorio (¡importante!)
         slots_to_remind = TimeSlot.objects.filter(
             start_time__gte=start_window,
-            start_time__lte=end_window
-            # Más adelante añadiremos un campo "reminder_sent"
-            # Por ahora, esto funciona para la prueba.
-        )
+            start_time__lte=end_window,
+            reminder_sent=False
+        ).select_related('activity')
+
+        # En modo sharded, solo las convocatorias de nuestra partición
+        if shards > 1:
+            slots_to_remind = slots_to_remind.annotate(shard=Mod('id', shards)).filter(shard=shard_index)
+
+        slots_to_remind = list(slots_to_remind)
 
-        if not slots_to_remind.exists():
+        if not slots_to_remind:
             print("--- Cron Job: No hay convocatorias que necesiten recordatorio. ---")
             return
 
-        print(f"--- Cron Job: ¡Se encontraron {slots_to_remind.count()} convocatorias! ---")
+        print(f"--- Cron Job: ¡Se encontraron {len(slots_to_remind)} convocatorias! ---")
 
         # 4. Por cada convocatoria, buscamos a los inscritos
         for slot in slots_to_remind:
-            enrollments = Enrollment.objects.filter(timeslot=slot)
+            # La reclamamos ya: solo el nodo cuyo UPDATE la cambia de False a True
+            # envía los correos (aunque cambie la configuración de shards entre nodos)
+            claimed = TimeSlot.objects.filter(id=slot.id, reminder_sent=False).update(reminder_sent=True)
+            if not claimed:
+                print(f"    > '{slot.activity.title}' ya la ha procesado otro nodo. Saltando.")
+                continue
 
-            if not enrollments.exists():
+            enrollments = list(Enrollment.objects.filter(timeslot=slot).select_related('user'))
+
+            if not enrollments:
                 print(f"    > '{slot.activity.title}' encontrado, pero no hay inscritos. Saltando.")
                 continue # Siguiente convocatoria si esta no tiene inscritos
 
-            print(f"--- Cron Job: Enviando {enrollments.count()} correos para {slot.activity.title} ---")
+            print(f"--- Cron Job: Enviando {len(enrollments)} correos para {slot.activity.title} ---")
 
             # 5. Preparamos y enviamos los correos
+            sent_events = []
             for enrollment in enrollments:
                 user_email = enrollment.user.email
                 activity_title = slot.activity.title
@@ -80,8 +115,100 @@ class SendReminderCronJob(CronJobBase):
                         fail_silently=False,
                     )
                     print(f"    > Correo enviado a {user_email}")
+                    sent_events.append(events.build_entry(Event.REMINDER_SENT, user_id=enrollment.user_id, timeslot_id=slot.id))
 
                 except Exception as e:
                     print(f"    > ERROR al enviar a {user_email}: {e}")
 
-        print("--- Cron Job: Finalizado. ---")
\ No newline at end of file
+            # Todos los eventos de esta convocatoria en un único pipeline
+            events.emit_many(sent_events)
+
+        print("--- Cron Job: Finalizado. ---")
+
+
+class SendNotificationsCronJob(CronJobBase):
+    """
+    Envía por lotes los emails encolados en Redis (p.ej. por los cambios
+    masivos de convocatorias), reutilizando una conexión por lote.
+    Si un lote falla, la excepción llega a django_cron y se reintenta en la siguiente ejecución.
+    """
+
+    RUN_EVERY_MINS = 1
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'api.send_notifications_cron_job'
+
+    def do(self):
+        # Un solo nodo a la vez: el lote en proceso de `send_pending` es compartido
+        with advisory_lock(self.code) as acquired:
+            if not acquired:
+                print("--- Notificaciones: Ya las está enviando otro nodo. Saltando. ---")
+                return
+
+            total = 0
+            while (count := notifications.send_pending()):
+                total += count
+            if total:
+                print(f"--- Notificaciones: {total} emails enviados. ---")
+
+
+class RefreshActivityStatsCronJob(CronJobBase):
+    """
+    Refresca las estadísticas de las actividades que han cambiado
+    (o a las que se les ha terminado alguna convocatoria).
+    """
+
+    RUN_EVERY_MINS = 10
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'api.refresh_activity_stats_cron_job'
+
+    def do(self):
+        count = refresh_stats()
+        print(f"--- Stats: {count} actividades recalculadas. ---")
+
+
+class PrewarmWaitingRoomsCronJob(CronJobBase):
+    """
+    Precarga en Redis las salas de espera de las convocatorias que
+    empiezan en los próximos minutos, para que los consumers no tengan
+    que ir todos a la vez a la BBDD justo antes de la hora.
+    """
+
+    RUN_EVERY_MINS = 5
+
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = 'api.prewarm_waiting_rooms_cron_job'
+
+    def do(self):
+        now = timezone.now()
+        end_window = now + timedelta(minutes=settings.WAITING_ROOM_PREWARM_MINS)
+
+        # 1. Convocatorias que empiezan dentro de la ventana (con su actividad en la misma query)
+        slots = list(
+            TimeSlot.objects.filter(start_time__gte=now, start_time__lte=end_window)
+            .select_related('activity')
+        )
+
+        if not slots:
+            print("--- Prewarm: No hay salas que precargar. ---")
+            return
+
+        # 2. Todos los inscritos de esas convocatorias en una sola query
+        users_by_slot = {slot.id: [] for slot in slots}
+        enrollments = Enrollment.objects.filter(timeslot__in=slots).values_list('timeslot_id', 'user_id')
+        for timeslot_id, user_id in enrollments:
+            users_by_slot[timeslot_id].append(user_id)
+
+        # 3. Escribimos todas las salas en un único pipeline
+        client = room_cache.get_sync_client()
+        with client.pipeline(transaction=False) as pipe:
+            for slot in slots:
+                state = room_cache.build_room_state(slot, users_by_slot[slot.id])
+                # La sala caduca una hora después de que termine la convocatoria.
+                ttl = int((slot.end_time - now).total_seconds()) + 3600
+                room_cache.store_room_state(pipe, state, max(ttl, 60))
+            pipe.incrby(room_cache.STATS_PREWARMED_KEY, len(slots))
+            pipe.execute()
+
+        print(f"--- Prewarm: {len(slots)} salas precargadas. Stats: {room_cache.get_stats()} ---")
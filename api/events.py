@@ -0,0 +1,164 @@
+# api/events.py
+
+import json
+import os
+import socket
+import uuid
+import redis
+from asgiref.sync import sync_to_async
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+
+from . import room_cache
+from .models import Event
+
+STREAM_KEY = 'events:stream'
+GROUP_NAME = 'event_writers'
+
+
+def build_entry(kind, user_id=None, timeslot_id=None, **data):
+    # Campos de una entrada del stream (Redis solo guarda strings)
+    return {
+        'kind': kind,
+        'user_id': '' if user_id is None else str(user_id),
+        'timeslot_id': '' if timeslot_id is None else str(timeslot_id),
+        'data': json.dumps(data),
+        'ts': str(datetime.now(dt_timezone.utc).timestamp()),
+    }
+
+
+def emit(kind, user_id=None, timeslot_id=None, **data):
+    """
+    Encola un evento en el stream de Redis (una sola escritura, sin tocar la BBDD).
+    Si Redis falla, el evento se guarda directamente en la BBDD (ver `save_directly`).
+    """
+    emit_many([build_entry(kind, user_id, timeslot_id, **data)])
+
+
+def emit_many(entries):
+    # Igual que `emit`, pero para varias entradas (de `build_entry`) en un único pipeline
+    if not entries:
+        return
+    try:
+        with room_cache.get_sync_client().pipeline(transaction=False) as pipe:
+            for entry in entries:
+                pipe.xadd(STREAM_KEY, entry, maxlen=settings.EVENT_STREAM_MAXLEN, approximate=True)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"    > ERROR al encolar {len(entries)} eventos, se guardan en la BBDD: {e}")
+        save_directly(entries)
+
+
+async def aemit(kind, user_id=None, timeslot_id=None, **data):
+    # Versión asíncrona de `emit` para los consumers
+    entry = build_entry(kind, user_id, timeslot_id, **data)
+    try:
+        await room_cache.get_async_client().xadd(
+            STREAM_KEY,
+            entry,
+            maxlen=settings.EVENT_STREAM_MAXLEN,
+            approximate=True
+        )
+    except redis.RedisError as e:
+        print(f"    > ERROR al encolar el evento '{kind}', se guarda en la BBDD: {e}")
+        await sync_to_async(save_directly)([entry])
+
+
+def save_directly(entries):
+    """
+    Plan B cuando Redis no está disponible: las entradas se guardan con un
+    bulk_create síncrono (más lento, pero no se pierden). No tienen ID del
+    stream, así que se les asigna uno propio que no puede coincidir con él.
+    """
+    Event.objects.bulk_create([
+        _to_event(f'db-{uuid.uuid4().hex[:29]}', entry) for entry in entries
+    ])
+
+
+# --- Worker (lo usa `manage.py flush_events`) ---
+
+def consumer_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def ensure_group():
+    try:
+        room_cache.get_sync_client().xgroup_create(STREAM_KEY, GROUP_NAME, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        # El grupo ya existe
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def _to_event(stream_id, fields):
+    # Acepta tanto lo que devuelve Redis (bytes) como una entrada de `build_entry` (str)
+    fields = {_to_str(k): _to_str(v) for k, v in fields.items()}
+    return Event(
+        kind=fields['kind'],
+        user_id=int(fields['user_id']) if fields['user_id'] else None,
+        timeslot_id=int(fields['timeslot_id']) if fields['timeslot_id'] else None,
+        data=json.loads(fields['data']),
+        occurred_at=datetime.fromtimestamp(float(fields['ts']), dt_timezone.utc),
+        stream_id=_to_str(stream_id),
+    )
+
+
+def _to_str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def flush(consumer, pending=False):
+    """
+    Lee un lote del stream, lo guarda con un único bulk_create y lo confirma (XACK).
+
+    Lo que llega al stream se entrega "al menos una vez": si el proceso muere
+    antes del XACK, el lote sigue pendiente y lo recupera `claim_stale` +
+    `flush(pending=True)` en la siguiente vuelta del worker (de este u otro).
+    Los duplicados se descartan gracias al `stream_id` único.
+    Excepción: si el worker está parado tanto tiempo que el stream supera
+    EVENT_STREAM_MAXLEN, Redis recorta las entradas más antiguas aunque no
+    se hayan volcado, y esas se pierden (ver settings).
+    Devuelve el número de eventos volcados.
+    """
+    client = room_cache.get_sync_client()
+    response = client.xreadgroup(
+        GROUP_NAME,
+        consumer,
+        {STREAM_KEY: '0' if pending else '>'},
+        count=settings.EVENT_FLUSH_BATCH_SIZE,
+        block=None if pending else settings.EVENT_FLUSH_INTERVAL_MS,
+    )
+    if not response:
+        return 0
+
+    _, entries = response[0]
+    if not entries:
+        return 0
+
+    # Las entradas ya recortadas del stream (MAXLEN) llegan sin campos: solo las confirmamos
+    Event.objects.bulk_create(
+        [_to_event(stream_id, fields) for stream_id, fields in entries if fields],
+        ignore_conflicts=True,
+    )
+    client.xack(STREAM_KEY, GROUP_NAME, *(stream_id for stream_id, _ in entries))
+    return len(entries)
+
+
+def claim_stale(consumer):
+    """
+    Se queda con los eventos pendientes de workers que murieron sin hacer XACK,
+    para volcarlos después con `flush(consumer, pending=True)`.
+    """
+    client = room_cache.get_sync_client()
+    start_id = '0-0'
+    claimed = 0
+    while True:
+        start_id, entries, *_ = client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, consumer,
+            min_idle_time=settings.EVENT_FLUSH_INTERVAL_MS * 2,
+            start_id=start_id,
+            justid=True,
+        )
+        claimed += len(entries)
+        if start_id in (b'0-0', '0-0'):
+            return claimed
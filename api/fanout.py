@@ -0,0 +1,107 @@
+# api/fanout.py
+
+import math
+from django.utils import timezone
+
+
+def split_into_groups(user_ids, max_participants):
+    """
+    Reparte a los usuarios en el mínimo número de grupos posible
+    sin superar `max_participants`, y con tamaños equilibrados.
+    (ej. 5 usuarios, max 4 -> grupos de 3 y 2)
+    """
+    if not user_ids:
+        return []
+
+    max_participants = max(1, max_participants)
+    num_groups = math.ceil(len(user_ids) / max_participants)
+    base, extra = divmod(len(user_ids), num_groups)
+
+    groups = []
+    start = 0
+    for i in range(num_groups):
+        size = base + (1 if i < extra else 0)
+        groups.append(list(user_ids[start:start + size]))
+        start += size
+    return groups
+
+
+def participant_key(user_id, channel_name):
+    """
+    Clave de una conexión en el reparto: el ID del usuario (así varias pestañas
+    del mismo usuario van a la misma sala) o, si es anónimo, su canal.
+    """
+    return str(user_id) if user_id is not None else f'anon:{channel_name}'
+
+
+def order_participants(keys, enrolled_ids):
+    """
+    Quita duplicados y ordena: primero los inscritos (en su orden), luego el resto.
+    """
+    enrolled = [str(user_id) for user_id in enrolled_ids]
+    present = set(keys)
+    return [key for key in enrolled if key in present] + sorted(present - set(enrolled))
+
+
+def build_call_assignments(room_id, participants, max_participants):
+    """
+    Crea una sala de Jitsi por grupo de los participantes presentes
+    (claves de `participant_key`) y devuelve el mensaje compacto
+    que se envía al grupo de Channels:
+    {
+        "launch_id": "...", "max_participants": 4,
+        "rooms": ["https://meet.jit.si/...", ...],
+        "members": {"<clave>": <índice de la sala>, ...}
+    }
+    Cada consumer busca su propia clave en "members", así que basta
+    con UN group_send para toda la sala, sea cual sea su tamaño.
+    """
+    groups = split_into_groups(participants, max_participants) or [[]]
+    launch_id = str(timezone.now().timestamp())
+
+    rooms = []
+    members = {}
+    for index, group in enumerate(groups):
+        rooms.append(f'https://meet.jit.si/talkabout_{room_id}_{index}_{launch_id}')
+        for key in group:
+            # msgpack (channels_redis) solo admite claves str en los diccionarios
+            members[key] = index
+
+    return {
+        'launch_id': launch_id,
+        'max_participants': max(1, max_participants),
+        'rooms': rooms,
+        'members': members,
+    }
+
+
+def resolve_call_url(event, key):
+    """
+    Devuelve la URL que le corresponde a un participante del reparto,
+    o None si no está en él (llegó después de lanzar la llamada).
+    """
+    index = event['members'].get(key)
+    if index is None:
+        return None
+    return event['rooms'][index]
+
+
+def assign_by_arrival(event, position):
+    """
+    URL para la conexión número `position` (0, 1, 2...) de las que llegan
+    después del reparto, por orden de llegada: primero se llenan las plazas
+    libres de las salas y, cuando no quedan, se reparten entre las salas
+    existentes (mejor pasarse del máximo que dejar a alguien solo).
+    """
+    rooms = event['rooms']
+    sizes = [0] * len(rooms)
+    for index in event['members'].values():
+        sizes[index] += 1
+
+    for index, size in enumerate(sizes):
+        free = max(0, event['max_participants'] - size)
+        if position < free:
+            return rooms[index]
+        position -= free
+
+    return rooms[position % len(rooms)]
@@ -0,0 +1,35 @@
+# api/locks.py
+
+import zlib
+from contextlib import contextmanager
+from django.db import connection
+
+
+def _lock_key(name):
+    # pg_try_advisory_lock(int, int) usa enteros de 32 bits con signo
+    key = zlib.crc32(name.encode())
+    return key - 2 ** 32 if key >= 2 ** 31 else key
+
+
+@contextmanager
+def advisory_lock(name, shard=0):
+    """
+    Lock distribuido con los advisory locks de PostgreSQL.
+    Devuelve True si lo hemos conseguido y False si otro proceso ya lo tiene
+    (no espera). El lock se libera al salir del bloque `with`.
+
+        with advisory_lock('api.send_reminder_cron_job') as acquired:
+            if not acquired:
+                return
+    """
+    key = _lock_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [key, shard])
+        acquired = cursor.fetchone()[0]
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [key, shard])
@@ -0,0 +1,115 @@
+# api/management/commands/archive_timeslots.py
+
+import statistics
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import TimeSlot, Enrollment, ArchivedTimeSlot, ArchivedEnrollment
+
+
+class Command(BaseCommand):
+    """
+    Mueve las convocatorias terminadas hace más de --days días (y sus inscripciones)
+    a ArchivedTimeSlot / ArchivedEnrollment, por lotes y cada lote en su transacción.
+    Así las tablas vivas (las que usan la sala de espera y el cron) siguen siendo pequeñas.
+
+    Uso: python manage.py archive_timeslots --days 90 --benchmark
+    """
+    help = 'Archiva las convocatorias antiguas y sus inscripciones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--benchmark', action='store_true', help='Mide las queries "calientes" antes y después.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_slots = TimeSlot.objects.filter(end_time__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'Se archivarían {old_slots.count()} convocatorias y '
+                f'{Enrollment.objects.filter(timeslot__end_time__lt=cutoff).count()} inscripciones.'
+            )
+            return
+
+        if options['benchmark']:
+            before = self.time_hot_queries()
+
+        total_slots = total_enrollments = 0
+        while True:
+            with transaction.atomic():
+                ids = list(old_slots.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                total_enrollments += self.archive_batch(ids)
+                total_slots += len(ids)
+            self.stdout.write(f'  > {total_slots} convocatorias archivadas...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_slots} convocatorias y {total_enrollments} inscripciones archivadas (anteriores a {cutoff:%Y-%m-%d}).'
+        ))
+
+        if total_slots:
+            # Recuperamos el espacio de las filas borradas y actualizamos estadísticas del planificador
+            with connection.cursor() as cursor:
+                for model in (Enrollment, TimeSlot):
+                    cursor.execute(f'VACUUM (ANALYZE) {model._meta.db_table}')
+
+        if options['benchmark']:
+            after = self.time_hot_queries()
+            for name in before:
+                self.stdout.write(f'{name:<28} antes: {before[name]:8.2f} ms | después: {after[name]:8.2f} ms')
+
+    def archive_batch(self, ids):
+        # 1. Copiamos las filas a las tablas de archivo (conservando los IDs)
+        ArchivedTimeSlot.objects.bulk_create(
+            [ArchivedTimeSlot(**row) for row in TimeSlot.objects.filter(id__in=ids).values(
+                'id', 'activity_id', 'start_time', 'end_time', 'reminder_sent'
+            )],
+            ignore_conflicts=True,
+        )
+        enrollments = [ArchivedEnrollment(**row) for row in Enrollment.objects.filter(timeslot_id__in=ids).values(
+            'id', 'user_id', 'timeslot_id', 'attended', 'enrolled_at'
+        )]
+        ArchivedEnrollment.objects.bulk_create(enrollments, ignore_conflicts=True)
+
+        # 2. Y las borramos de las tablas vivas (sin señales: un DELETE por tabla).
+        # Archivar no cambia las estadísticas: no hay que marcarlas.
+        Enrollment.objects.filter(timeslot_id__in=ids).delete()
+        TimeSlot.objects.filter(id__in=ids).delete()
+        return len(enrollments)
+
+    def time_hot_queries(self, repeat=20):
+        # Las mismas queries que hacen el cron de recordatorios, la precarga y la sala de espera
+        now = timezone.now()
+        next_slot = TimeSlot.objects.filter(start_time__gte=now).order_by('start_time').first()
+        queries = {
+            'cron recordatorios': lambda: list(TimeSlot.objects.filter(
+                start_time__gte=now + timedelta(minutes=30),
+                start_time__lte=now + timedelta(minutes=60),
+                reminder_sent=False,
+            ).select_related('activity')),
+            'precarga de salas': lambda: list(TimeSlot.objects.filter(
+                start_time__gte=now,
+                start_time__lte=now + timedelta(minutes=settings.WAITING_ROOM_PREWARM_MINS),
+            ).select_related('activity')),
+            'inscritos de una sala': lambda: list(Enrollment.objects.filter(
+                timeslot_id=next_slot.id if next_slot else 0
+            ).values_list('user_id', flat=True)),
+        }
+
+        results = {}
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+        return results
@@ -0,0 +1,134 @@
+# api/management/commands/bench_api.py
+
+import json
+import statistics
+import time
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api import events
+from api.cron import SendReminderCronJob
+from api.models import User, Activity
+from api.urls import router
+
+
+class Command(BaseCommand):
+    """
+    Suite de regresión de rendimiento de la API.
+
+    Mide el número de queries y la latencia (mediana) de:
+    - list y detail de cada endpoint del router,
+    - EdxLoginView,
+    - ActivityViewSet.create_bulk_slots,
+    - SendReminderCronJob.do
+    y lo compara con un baseline en JSON. Falla si algún caso hace más queries
+    que en el baseline o si su latencia empeora más de --threshold.
+
+    Todo (incluido el usuario 'bench_admin') se hace dentro de una transacción
+    que se deshace al final, y cada caso en su propio savepoint.
+    Conviene ejecutarlo sobre datos de `seed_data`.
+
+    Uso:
+        python manage.py bench_api --update-baseline   # guarda el baseline
+        python manage.py bench_api                     # compara con el baseline
+    """
+    help = 'Benchmark de queries y latencia de la API, comparado con un baseline JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'bench_baseline.json'))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--threshold', type=float, default=0.25, help='Empeoramiento de latencia permitido (0.25 = 25%%).')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Todo se deshace al final, también el usuario del benchmark. Y los eventos
+        # (p.ej. 'reminder_sent' del cron) no se mandan al stream de Redis, que no se deshace.
+        with transaction.atomic(), mock.patch.object(events, 'emit_many'):
+            results = self.run_cases(options['repeat'])
+            transaction.set_rollback(True)
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline'] or not baseline_path.exists():
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Baseline guardado en {baseline_path}'))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+            if result['ms'] > before['ms'] * (1 + options['threshold']):
+                regressions.append(f"{name}: {before['ms']:.2f} -> {result['ms']:.2f} ms")
+
+        if regressions:
+            raise CommandError('Regresiones de rendimiento:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto al baseline.'))
+
+    def run_cases(self, repeat):
+        admin, _ = User.objects.get_or_create(
+            edx_user_id='bench_admin',
+            defaults={'username': 'bench_admin', 'email': 'bench_admin@example.com', 'is_staff': True, 'is_superuser': True},
+        )
+        self.client = APIClient(HTTP_HOST='localhost')
+        self.client.force_authenticate(admin)
+
+        results = {}
+        for name, case in self.get_cases(admin):
+            results[name] = self.measure(case, repeat)
+            self.stdout.write(f"{name:<45} {results[name]['queries']:>5} queries {results[name]['ms']:>9.2f} ms")
+        return results
+
+    def get_cases(self, admin):
+        # 1. list y detail de cada ViewSet registrado en el router
+        for prefix, viewset, basename in router.registry:
+            yield f'GET {prefix} list', lambda b=basename: self.client.get(reverse(f'{b}-list'))
+            obj = viewset.queryset.model.objects.order_by('id').first()
+            if obj is not None:
+                yield f'GET {prefix} detail', lambda b=basename, pk=obj.pk: self.client.get(reverse(f'{b}-detail', args=[pk]))
+
+        # 2. Login de edX (usuario ya existente)
+        login_client = APIClient(HTTP_HOST='localhost')
+        yield 'POST auth/login', lambda: login_client.post(
+            reverse('edx_login'),
+            {'edx_user_id': admin.edx_user_id, 'email': admin.email, 'timezone': 'UTC'},
+            format='json',
+        )
+
+        # 3. Creación masiva de convocatorias (un mes, 3 días por semana)
+        activity = Activity.objects.order_by('id').first()
+        if activity is not None:
+            yield 'POST activities create_bulk_slots', lambda: self.client.post(
+                reverse('activity-create-bulk-slots', args=[activity.pk]),
+                {'start_date': '2030-01-01', 'end_date': '2030-01-31', 'start_time': '14:00', 'end_time': '15:00', 'weekdays': [0, 2, 4]},
+                format='json',
+            )
+
+        # 4. Cron de recordatorios (con un backend de email en memoria)
+        yield 'cron SendReminderCronJob.do', lambda: SendReminderCronJob().do()
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def measure(self, case, repeat):
+        timings = []
+        queries = 0
+        for _ in range(repeat):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = case()
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries = len(ctx.captured_queries)
+                # Deshacemos cualquier escritura del caso
+                transaction.set_rollback(True)
+            if response is not None and response.status_code >= 400:
+                raise CommandError(f'El caso devolvió {response.status_code}: {response.content[:200]}')
+        return {'queries': queries, 'ms': statistics.median(timings)}
@@ -0,0 +1,76 @@
+# api/management/commands/bench_bulk_reschedule.py
+
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import User, Activity, TimeSlot
+
+
+class Command(BaseCommand):
+    """
+    Compara mover N convocatorias una a una (PATCH en /api/timeslots/<id>/)
+    con un único POST a /api/activities/<id>/bulk_update_slots/.
+    Todo (incluido el usuario 'bench_admin') se hace dentro de una transacción
+    que se deshace al final.
+
+    Uso: python manage.py bench_bulk_reschedule --slots 500
+    """
+    help = 'Benchmark del cambio masivo de convocatorias frente a la API por convocatoria.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=500)
+
+    def handle(self, *args, **options):
+        client = APIClient(HTTP_HOST='localhost')
+
+        for name, run in (('por convocatoria (PATCH)', self.run_per_slot), ('bulk_update_slots', self.run_bulk)):
+            with transaction.atomic():
+                # El usuario también se crea dentro de la transacción que se deshace
+                owner, _ = User.objects.get_or_create(
+                    edx_user_id='bench_admin',
+                    defaults={'username': 'bench_admin', 'email': 'bench_admin@example.com', 'is_staff': True, 'is_superuser': True},
+                )
+                client.force_authenticate(owner)
+                activity, slots = self.create_slots(owner, options['slots'])
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    run(client, activity, slots)
+                    elapsed = (time.perf_counter() - start) * 1000
+                transaction.set_rollback(True)
+            self.stdout.write(f'{name:<26} {len(ctx.captured_queries):>6} queries {elapsed:10.1f} ms')
+
+    def create_slots(self, owner, count):
+        activity = Activity.objects.create(owner=owner, title='Bench reschedule', description='')
+        first = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        slots = TimeSlot.objects.bulk_create([
+            TimeSlot(activity=activity, start_time=first + timedelta(days=i), end_time=first + timedelta(days=i, hours=1))
+            for i in range(count)
+        ])
+        return activity, slots
+
+    def run_per_slot(self, client, activity, slots):
+        for slot in slots:
+            response = client.patch(
+                reverse('timeslot-detail', args=[slot.id]),
+                {'start_time': (slot.start_time + timedelta(hours=1)).isoformat(),
+                 'end_time': (slot.end_time + timedelta(hours=1)).isoformat()},
+                format='json',
+            )
+            if response.status_code != 200:
+                raise CommandError(f'PATCH devolvió {response.status_code}: {response.content[:200]}')
+
+    def run_bulk(self, client, activity, slots):
+        response = client.post(
+            reverse('activity-bulk-update-slots', args=[activity.id]),
+            {'start_date': f'{slots[0].start_time:%Y-%m-%d}', 'end_date': f'{slots[-1].start_time:%Y-%m-%d}',
+             'operation': 'shift', 'shift_minutes': 60},
+            format='json',
+        )
+        if response.status_code != 200:
+            raise CommandError(f'bulk_update_slots devolvió {response.status_code}: {response.content[:200]}')
@@ -0,0 +1,65 @@
+# api/management/commands/bench_fanout.py
+
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from channels.layers import get_channel_layer
+
+from api import fanout
+
+
+class Command(BaseCommand):
+    """
+    Compara la latencia de entregar `call_launched` a toda una sala:
+    - 'per_channel': un `send` por miembro con su propia URL (un viaje a Redis cada uno).
+    - 'group_map': un único `group_send` con el reparto compacto miembro -> sala.
+
+    Uso: python manage.py bench_fanout --sizes 10 100 1000
+    """
+    help = 'Benchmark del fan-out de call_launched en salas de distintos tamaños.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000])
+        parser.add_argument('--max-participants', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        layer = get_channel_layer()
+
+        for size in options['sizes']:
+            user_ids = list(range(1, size + 1))
+            group = f'bench_fanout_{size}'
+            channels = [await layer.new_channel() for _ in user_ids]
+            for channel in channels:
+                await layer.group_add(group, channel)
+
+            assignments = fanout.build_call_assignments('bench', [str(user_id) for user_id in user_ids], options['max_participants'])
+
+            per_channel, group_map = [], []
+            for _ in range(options['repeat']):
+                # 1. Un send por miembro
+                start = time.perf_counter()
+                for user_id, channel in zip(user_ids, channels):
+                    url = fanout.resolve_call_url(assignments, str(user_id))
+                    await layer.send(channel, {'type': 'call_launched', 'url': url})
+                await asyncio.gather(*(layer.receive(c) for c in channels))
+                per_channel.append(time.perf_counter() - start)
+
+                # 2. Un único group_send con el mapa compacto
+                start = time.perf_counter()
+                await layer.group_send(group, {'type': 'call_launched', **assignments})
+                messages = await asyncio.gather(*(layer.receive(c) for c in channels))
+                for user_id, channel, message in zip(user_ids, channels, messages):
+                    fanout.resolve_call_url(message, str(user_id))
+                group_map.append(time.perf_counter() - start)
+
+            for channel in channels:
+                await layer.group_discard(group, channel)
+
+            self.stdout.write(
+                f'{size:>5} miembros | per_channel: {min(per_channel) * 1000:8.1f} ms '
+                f'| group_map: {min(group_map) * 1000:8.1f} ms'
+            )
@@ -0,0 +1,50 @@
+# api/management/commands/bench_search.py
+
+import statistics
+import time
+from django.core.management.base import BaseCommand
+
+from api.models import Activity
+from api.search import search_activities
+
+
+class Command(BaseCommand):
+    """
+    Mide la latencia de `search_activities` (facets + primera página).
+    Para 100k actividades: python manage.py seed_data --activities 100000
+    y luego: python manage.py bench_search
+    """
+    help = 'Benchmark de la búsqueda de actividades.'
+
+    QUERIES = [
+        # Sin texto: el listado por defecto (sin facetas)
+        ('', {}),
+        ('', {'upcoming': True}),
+        ('actividad', {}),
+        ('conver', {}),
+        ('tema 42', {}),
+        ('actividad', {'upcoming': True}),
+        ('actividad', {'free_seats': True}),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{Activity.objects.count()} actividades en la BBDD.')
+
+        for text, filters in self.QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                activities, facets = search_activities(text, **filters)
+                list(activities.values_list('id', flat=True)[:options['limit']])
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(
+                f'{text!r:<14} {str(filters):<24} {facets["count"]:>7} resultados '
+                f'| p50: {statistics.median(timings):7.2f} ms | p95: {p95:7.2f} ms'
+            )
@@ -0,0 +1,60 @@
+# api/management/commands/bench_serializers.py
+
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.models import TimeSlot, Enrollment
+from api.serializers import TimeSlotSerializer, EnrollmentSerializer, fast_serialize
+
+
+class Command(BaseCommand):
+    """
+    Compara ModelSerializer(many=True) con `fast_serialize` y comprueba
+    que el JSON que producen ambos es idéntico.
+
+    Uso: python manage.py bench_serializers --rows 5000
+    """
+    help = 'Benchmark y comprobación de contrato de la serialización rápida.'
+
+    CASES = [
+        (TimeSlot, TimeSlotSerializer),
+        (Enrollment, EnrollmentSerializer),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+
+        for model, serializer_class in self.CASES:
+            queryset = model.objects.order_by('id')[:options['rows']]
+
+            # 1. Contrato: mismo JSON con los dos caminos
+            slow = renderer.render(serializer_class(queryset, many=True).data)
+            fast = renderer.render(fast_serialize(queryset, serializer_class))
+            if slow != fast:
+                raise CommandError(f'{serializer_class.__name__}: la salida rápida no coincide con la del serializer.')
+
+            # 2. Tiempos (query + serialización)
+            timings = {}
+            for name, serialize in (
+                ('serializer', lambda: serializer_class(queryset.all(), many=True).data),
+                ('fast', lambda: fast_serialize(queryset.all(), serializer_class)),
+            ):
+                best = None
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    serialize()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                timings[name] = best * 1000
+
+            rows = len(json.loads(fast))
+            self.stdout.write(
+                f'{serializer_class.__name__:<22} {rows:>6} filas | serializer: {timings["serializer"]:8.2f} ms '
+                f'| fast: {timings["fast"]:8.2f} ms | x{timings["serializer"] / max(timings["fast"], 1e-9):.1f}'
+            )
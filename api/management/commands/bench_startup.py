@@ -0,0 +1,65 @@
+# api/management/commands/bench_startup.py
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Mide el arranque en frío de cada tipo de proceso con `python -X importtime`:
+    tiempo total, tiempo de imports y número de módulos importados.
+
+    Uso: python manage.py bench_startup --repeat 5
+    """
+    help = 'Benchmark del arranque de los procesos API, websocket y cron.'
+
+    # Lo que importa cada proceso al arrancar
+    ENTRY_POINTS = {
+        'api': 'import backend.wsgi',
+        'websocket': 'import backend.asgi',
+        'cron': 'import django; django.setup(); import api.cron',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--compare-all', action='store_true', help='Mide también cada entrada con el perfil "all".')
+
+    def handle(self, *args, **options):
+        for role, code in self.ENTRY_POINTS.items():
+            profiles = [role, 'all'] if options['compare_all'] else [role]
+            for profile in profiles:
+                wall, imports, modules = self.measure(code, profile, options['repeat'])
+                self.stdout.write(
+                    f'{role:<10} (perfil {profile:<9}) | total: {wall:7.1f} ms '
+                    f'| imports: {imports:7.1f} ms | {modules} módulos'
+                )
+
+    def measure(self, code, profile, repeat):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),
+            'TALKABOUT_PROCESS_ROLE': profile,
+        }
+        walls, imports = [], []
+        modules = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            )
+            walls.append((time.perf_counter() - start) * 1000)
+
+            # Líneas "import time: self [us] | cumulative | paquete"; las de primer nivel no van sangradas
+            lines = [line for line in result.stderr.splitlines() if line.startswith('import time:') and '|' in line]
+            lines = [line for line in lines if not line.rstrip().endswith('imported package')]
+            modules = len(lines)
+            imports.append(sum(
+                int(line.split('|')[1]) for line in lines if not line.split('|')[2].startswith('  ')
+            ) / 1000)
+        return statistics.median(walls), statistics.median(imports), modules
@@ -0,0 +1,61 @@
+# api/management/commands/bench_ws_protocol.py
+
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import protocol
+
+
+class Command(BaseCommand):
+    """
+    Compara JSON y msgpack para un ciclo completo de la sala de espera:
+    bienvenida + cuenta atrás + redirect, multiplicado por el número de clientes.
+
+    Uso: python manage.py bench_ws_protocol --clients 1000
+    """
+    help = 'Benchmark de codificación y ancho de banda del protocolo de la sala de espera.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        room_id = 12345
+        cycle = [('connection_established', {
+            'room_id': room_id,
+            'message': f'¡Conectado a la sala de espera {room_id}!'
+        })]
+        cycle += [('countdown', {'time_left': i}) for i in range(settings.WAITING_ROOM_WAIT_SECONDS, 0, -1)]
+        cycle.append(('redirect', {'url': f'https://meet.jit.si/talkabout_{room_id}_0_{time.time()}'}))
+
+        formats = {
+            'json': (
+                lambda t, d: protocol.encode_json(t, d).encode(),
+                lambda f: json.loads(f),
+            ),
+            'msgpack': (protocol.encode_msgpack, protocol.decode_msgpack),
+        }
+
+        for name, (encode, decode) in formats.items():
+            frames = [encode(t, d) for t, d in cycle]
+
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                for t, d in cycle:
+                    encode(t, d)
+            encode_us = (time.perf_counter() - start) / (options['repeat'] * len(cycle)) * 1e6
+
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                for frame in frames:
+                    decode(frame)
+            decode_us = (time.perf_counter() - start) / (options['repeat'] * len(frames)) * 1e6
+
+            cycle_bytes = sum(len(f) for f in frames)
+            self.stdout.write(
+                f'{name:>8} | encode: {encode_us:6.2f} us/frame | decode: {decode_us:6.2f} us/frame '
+                f'| ciclo: {cycle_bytes} B/cliente | {options["clients"]} clientes: '
+                f'{cycle_bytes * options["clients"] / 1024:.1f} KiB'
+            )
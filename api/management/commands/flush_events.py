@@ -0,0 +1,40 @@
+# api/management/commands/flush_events.py
+
+from django.core.management.base import BaseCommand
+
+from api import events
+
+
+class Command(BaseCommand):
+    """
+    Worker que vuelca en bloque los eventos del stream de Redis a la tabla Event.
+    En cada vuelta recupera también lo que quedó pendiente (sin XACK) de workers caídos.
+
+    Uso: python manage.py flush_events          # bucle infinito
+         python manage.py flush_events --once   # vacía lo que haya y termina
+    """
+    help = 'Vuelca el stream de eventos de Redis a la base de datos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true')
+
+    def handle(self, *args, **options):
+        events.ensure_group()
+        consumer = events.consumer_name()
+
+        while True:
+            # 1. Lo que dejaron pendiente (sin XACK) workers caídos, en cada vuelta:
+            #    si otro worker muere mientras este sigue vivo, también lo recuperamos
+            events.claim_stale(consumer)
+            recovered = 0
+            while (count := events.flush(consumer, pending=True)):
+                recovered += count
+            if recovered:
+                self.stdout.write(f'{recovered} eventos pendientes recuperados.')
+
+            # 2. Eventos nuevos (espera como mucho EVENT_FLUSH_INTERVAL_MS)
+            count = events.flush(consumer)
+            if count:
+                self.stdout.write(f'{count} eventos guardados.')
+            elif options['once']:
+                return
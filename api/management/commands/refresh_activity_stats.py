@@ -0,0 +1,47 @@
+# api/management/commands/refresh_activity_stats.py
+
+import time
+from django.core.management.base import BaseCommand
+
+from api.models import Activity, ActivityStats
+from api.stats import compute_stats, refresh_stats
+
+
+class Command(BaseCommand):
+    """
+    Recalcula las estadísticas precalculadas de las actividades (ActivityStats).
+    Por defecto solo las que han cambiado; con --full, todas.
+
+    Uso: python manage.py refresh_activity_stats [--full] [--benchmark]
+    """
+    help = 'Refresca las estadísticas de las actividades.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--benchmark', action='store_true', help='Compara leer el resumen con calcularlo en vivo.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = refresh_stats(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} actividades recalculadas en {(time.perf_counter() - start) * 1000:.1f} ms.'
+        ))
+
+        if options['benchmark']:
+            self.benchmark()
+
+    def benchmark(self, repeat=10):
+        activity_ids = list(Activity.objects.values_list('id', flat=True)[:100])
+        if not activity_ids:
+            return
+
+        for name, run in (
+            ('en vivo (JOINs)', lambda activity_id: compute_stats([activity_id])),
+            ('resumen', lambda activity_id: ActivityStats.objects.filter(activity_id=activity_id).first()),
+        ):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for activity_id in activity_ids:
+                    run(activity_id)
+            elapsed = (time.perf_counter() - start) / (repeat * len(activity_ids)) * 1000
+            self.stdout.write(f'{name:<16} {elapsed:8.3f} ms por actividad')
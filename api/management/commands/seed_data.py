@@ -0,0 +1,112 @@
+# api/management/commands/seed_data.py
+
+import random
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import User, Activity, ActivityFile, TimeSlot, Enrollment
+
+
+class Command(BaseCommand):
+    """
+    Genera datos sintéticos (reproducibles con --seed) para pruebas de rendimiento.
+    Todo se inserta con bulk_create.
+
+    Uso: python manage.py seed_data --users 10000 --activities 500 --seed 42
+    """
+    help = 'Genera usuarios, actividades, archivos, convocatorias e inscripciones sintéticas.'
+
+    BATCH_SIZE = 5000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--teachers', type=int, default=20)
+        parser.add_argument('--activities', type=int, default=100)
+        parser.add_argument('--files-per-activity', type=int, default=2)
+        parser.add_argument('--weeks', type=int, default=8, help='Semanas de convocatorias (la mitad en el pasado).')
+        parser.add_argument('--slots-per-week', type=int, default=3)
+        parser.add_argument('--enrollments-per-slot', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed', help='Prefijo de username/email de los usuarios generados.')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+
+        # 1. Profesores y alumnos
+        teachers = User.objects.bulk_create([
+            User(
+                username=f'{prefix}_teacher_{i}',
+                email=f'{prefix}_teacher_{i}@example.com',
+                edx_user_id=f'{prefix}_teacher_{i}',
+                password='!',
+                is_staff=True,
+            )
+            for i in range(options['teachers'])
+        ], batch_size=self.BATCH_SIZE)
+        students = User.objects.bulk_create([
+            User(
+                username=f'{prefix}_user_{i}',
+                email=f'{prefix}_user_{i}@example.com',
+                edx_user_id=f'{prefix}_user_{i}',
+                password='!',
+                timezone=rng.choice(['Europe/Madrid', 'America/Mexico_City', 'UTC']),
+            )
+            for i in range(options['users'])
+        ], batch_size=self.BATCH_SIZE)
+        self.stdout.write(f'{len(teachers)} profesores y {len(students)} alumnos creados.')
+
+        # 2. Actividades y sus archivos
+        activities = Activity.objects.bulk_create([
+            Activity(
+                owner=rng.choice(teachers),
+                title=f'Actividad {i}',
+                description=f'<p>Conversación sobre el tema {i}.</p>',
+                max_participants=rng.choice([2, 3, 4, 5, 6, 8, 10]),
+            )
+            for i in range(options['activities'])
+        ], batch_size=self.BATCH_SIZE)
+        ActivityFile.objects.bulk_create([
+            ActivityFile(activity=activity, name=f'Material {j}', url=f'https://example.com/{activity.id}/{j}.pdf')
+            for activity in activities
+            for j in range(options['files_per_activity'])
+        ], batch_size=self.BATCH_SIZE)
+        self.stdout.write(f'{len(activities)} actividades creadas.')
+
+        # 3. Convocatorias recurrentes: la mitad en el pasado y la mitad en el futuro
+        today = timezone.now().date()
+        first_day = today - timedelta(weeks=options['weeks'] // 2)
+        slots = []
+        for activity in activities:
+            weekdays = rng.sample(range(7), min(options['slots_per_week'], 7))
+            hour = rng.randint(8, 21)
+            for day in range(options['weeks'] * 7):
+                date = first_day + timedelta(days=day)
+                if date.weekday() in weekdays:
+                    start = timezone.make_aware(datetime.combine(date, time(hour)), timezone.utc)
+                    slots.append(TimeSlot(activity=activity, start_time=start, end_time=start + timedelta(hours=1)))
+        slots = TimeSlot.objects.bulk_create(slots, batch_size=self.BATCH_SIZE)
+        self.stdout.write(f'{len(slots)} convocatorias creadas.')
+
+        # 4. Inscripciones (sin repetir usuario en la misma convocatoria)
+        now = timezone.now()
+        enrollments = []
+        total = 0
+        for slot in slots:
+            count = min(rng.randint(0, options['enrollments_per_slot'] * 2), len(students))
+            for student in rng.sample(students, count):
+                enrollments.append(Enrollment(
+                    user=student,
+                    timeslot=slot,
+                    attended=slot.start_time < now and rng.random() < 0.8,
+                ))
+            if len(enrollments) >= self.BATCH_SIZE:
+                Enrollment.objects.bulk_create(enrollments, batch_size=self.BATCH_SIZE)
+                total += len(enrollments)
+                enrollments = []
+        Enrollment.objects.bulk_create(enrollments, batch_size=self.BATCH_SIZE)
+        total += len(enrollments)
+        self.stdout.write(self.style.SUCCESS(f'{total} inscripciones creadas.'))
@@ -0,0 +1,35 @@
+# api/middleware.py
+
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    # Mismo token 'access' que usa la API REST (ver EdxLoginView)
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Autentica los websockets con el JWT de la API. Los navegadores no dejan
+    enviar cabeceras al abrir un websocket, así que el token va en la URL:
+    ws/waitroom/<id>/?token=<access>
+
+    Si no hay token se deja el usuario que haya puesto AuthMiddlewareStack
+    (sesión de Django, o anónimo).
+    """
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get('query_string', b'').decode())
+        if 'token' in params:
+            scope = dict(scope, user=await get_user_for_token(params['token'][0]))
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_activity_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='reminder_sent',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.25 on 2026-10-19 11:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# El vector se calcula en la BBDD: el título pesa más ('A') que la descripción ('B'),
+# y a la descripción le quitamos las etiquetas HTML.
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('spanish', coalesce({prefix}title, '')), 'A') ||
+    setweight(to_tsvector('spanish', regexp_replace(coalesce({prefix}description, ''), '<[^>]+>', ' ', 'g')), 'B')
+"""
+
+CREATE_TRIGGER_SQL = f"""
+CREATE FUNCTION api_activity_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(prefix='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_activity_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON api_activity
+    FOR EACH ROW EXECUTE FUNCTION api_activity_search_vector_update();
+
+UPDATE api_activity SET search_vector = {SEARCH_VECTOR_SQL.format(prefix='')};
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS api_activity_search_vector_trigger ON api_activity;
+DROP FUNCTION IF EXISTS api_activity_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_timeslot_reminder_sent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='activity_search_vector_idx'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_activity_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['timeslot', 'attended'], name='enrollment_timeslot_att_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_enrollment_timeslot_attended_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('enrolled', 'Inscrito'), ('unenrolled', 'Desinscrito'), ('joined_room', 'Entró en la sala'), ('call_launched', 'Llamada lanzada'), ('reminder_sent', 'Recordatorio enviado')], max_length=32)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('timeslot_id', models.BigIntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('occurred_at', models.DateTimeField()),
+                ('stream_id', models.CharField(max_length=32, unique=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timeslot_id', 'kind'], name='event_timeslot_kind_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.25 on 2026-10-19 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTimeSlot',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('reminder_sent', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_timeslots', to='api.activity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['activity', 'start_time'], name='archived_slot_activity_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEnrollment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('attended', models.BooleanField(default=False)),
+                ('enrolled_at', models.DateTimeField()),
+                ('timeslot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='api.archivedtimeslot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_enrollments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'timeslot')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.25 on 2026-10-19 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_archivedtimeslot_archivedenrollment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityStats',
+            fields=[
+                ('activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.activity')),
+                ('total_slots', models.PositiveIntegerField(default=0)),
+                ('finished_slots', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('finished_enrollments', models.PositiveIntegerField(default=0)),
+                ('attended', models.PositiveIntegerField(default=0)),
+                ('dirty', models.BooleanField(default=False)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -3,6 +3,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 # -------------------------------------------------
 # MODELO 1: USUARIO PERSONALIZADO
@@ -33,6 +35,14 @@ class Activity(models.Model):
     max_participants = models.PositiveIntegerField(default=10)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Índice de búsqueda de texto completo (título + descripción).
+    # Lo mantiene un trigger de PostgreSQL (ver migración 0004), no Django.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='activity_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -58,6 +68,8 @@ class TimeSlot(models.Model):
     activity = models.ForeignKey(Activity, related_name='timeslots', on_delete=models.CASCADE)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
+    # Se marca cuando el cron ya ha enviado el recordatorio (para no enviarlo dos veces).
+    reminder_sent = models.BooleanField(default=False)
 
     def __str__(self):
         # Formateamos la fecha para que sea legible en el admin
@@ -75,7 +87,107 @@ class Enrollment(models.Model):
 
     class Meta:
         # Esto asegura que un usuario no se pueda inscribir dos veces en la misma convocatoria.
+        # (Y de paso crea el índice (user, timeslot) que usan los listados de cada alumno.)
+        unique_together = ('user', 'timeslot')
+        indexes = [
+            # Listados por convocatoria y recuento de asistentes
+            models.Index(fields=['timeslot', 'attended'], name='enrollment_timeslot_att_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} enrolled in {self.timeslot}"
+
+# -------------------------------------------------
+# MODELO 6: EVENTO (HISTÓRICO PARA ANALÍTICA)
+# -------------------------------------------------
+# Registro de solo-añadir. No se escribe desde las peticiones: se encola en
+# un stream de Redis (ver api/events.py) y un worker lo vuelca en bloque.
+class Event(models.Model):
+    ENROLLED = 'enrolled'
+    UNENROLLED = 'unenrolled'
+    JOINED_ROOM = 'joined_room'
+    CALL_LAUNCHED = 'call_launched'
+    REMINDER_SENT = 'reminder_sent'
+    KIND_CHOICES = [
+        (ENROLLED, 'Inscrito'),
+        (UNENROLLED, 'Desinscrito'),
+        (JOINED_ROOM, 'Entró en la sala'),
+        (CALL_LAUNCHED, 'Llamada lanzada'),
+        (REMINDER_SENT, 'Recordatorio enviado'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    # IDs sin ForeignKey: el histórico se conserva aunque se borre el usuario o la convocatoria.
+    user_id = models.BigIntegerField(null=True, blank=True)
+    timeslot_id = models.BigIntegerField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    occurred_at = models.DateTimeField()
+    # ID de la entrada en el stream de Redis: evita duplicados si un lote se reentrega.
+    stream_id = models.CharField(max_length=32, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timeslot_id', 'kind'], name='event_timeslot_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} @ {self.occurred_at}"
+
+
+# -------------------------------------------------
+# MODELOS 7 y 8: HISTÓRICO ARCHIVADO
+# -------------------------------------------------
+# Convocatorias antiguas (y sus inscripciones) que `manage.py archive_timeslots`
+# saca de las tablas "vivas" para que sus índices sigan siendo pequeños.
+# Conservan el mismo ID que tenían en TimeSlot / Enrollment.
+class ArchivedTimeSlot(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    activity = models.ForeignKey(Activity, related_name='archived_timeslots', on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    reminder_sent = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['activity', 'start_time'], name='archived_slot_activity_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.activity.title} @ {self.start_time.strftime('%Y-%m-%d %H:%M')} UTC (archivada)"
+
+
+class ArchivedEnrollment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, related_name='archived_enrollments', on_delete=models.CASCADE)
+    timeslot = models.ForeignKey(ArchivedTimeSlot, related_name='enrollments', on_delete=models.CASCADE)
+    attended = models.BooleanField(default=False)
+    enrolled_at = models.DateTimeField()
+
+    class Meta:
         unique_together = ('user', 'timeslot')
 
     def __str__(self):
-        return f"{self.user.email} enrolled in {self.timeslot}"
\ No newline at end of file
+        return f"{self.user.email} enrolled in {self.timeslot}"
+
+
+# -------------------------------------------------
+# MODELO 9: ESTADÍSTICAS DE ACTIVIDAD (RESUMEN)
+# -------------------------------------------------
+# Contadores precalculados para el panel del profesor (ver api/stats.py).
+# Cuando cambian inscripciones o convocatorias se marca `dirty`, y
+# `manage.py refresh_activity_stats` recalcula solo las actividades afectadas.
+class ActivityStats(models.Model):
+    activity = models.OneToOneField(Activity, primary_key=True, related_name='stats', on_delete=models.CASCADE)
+    total_slots = models.PositiveIntegerField(default=0)
+    finished_slots = models.PositiveIntegerField(default=0)
+    # Plazas ofertadas: convocatorias * max_participants
+    capacity = models.PositiveIntegerField(default=0)
+    enrollments = models.PositiveIntegerField(default=0)
+    finished_enrollments = models.PositiveIntegerField(default=0)
+    attended = models.PositiveIntegerField(default=0)
+    dirty = models.BooleanField(default=False)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Stats de {self.activity_id}"
@@ -0,0 +1,81 @@
+# api/notifications.py
+
+import json
+import redis
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import room_cache
+
+QUEUE_KEY = 'notifications:queue'
+# Lote que se está enviando: sale de aquí solo cuando el envío ha ido bien.
+PROCESSING_KEY = 'notifications:processing'
+ATTEMPTS_KEY = 'notifications:processing:attempts'
+# Lotes que han fallado NOTIFICATIONS_MAX_ATTEMPTS veces (para revisarlos a mano).
+FAILED_KEY = 'notifications:failed'
+
+
+def enqueue(messages):
+    """
+    Encola emails (diccionarios con 'to', 'subject' y 'body') en Redis, en un
+    único RPUSH. Los envía `SendNotificationsCronJob` por lotes.
+    Si Redis no está disponible, se envían directamente (más lento, pero no se pierden).
+    """
+    if not messages:
+        return
+    try:
+        room_cache.get_sync_client().rpush(QUEUE_KEY, *(json.dumps(m) for m in messages))
+    except redis.RedisError as e:
+        print(f"    > ERROR al encolar {len(messages)} emails, se envían ya: {e}")
+        _send(messages)
+
+
+def _send(messages):
+    # Una sola conexión para todo el lote. Si falla, lanza la excepción.
+    connection = get_connection()
+    connection.send_messages([
+        EmailMessage(m['subject'], m['body'], settings.DEFAULT_FROM_EMAIL, [m['to']], connection=connection)
+        for m in messages
+    ])
+
+
+def send_pending(batch_size=None):
+    """
+    Envía un lote de emails pendientes usando una sola conexión al backend de email.
+    Devuelve el número de emails enviados.
+
+    El lote pasa primero de la cola a PROCESSING_KEY (LMOVE) y solo se borra de
+    ahí cuando el backend lo ha aceptado. Si el envío falla (o el proceso muere),
+    la siguiente llamada reintenta ese mismo lote antes de coger otro.
+    Solo debe ejecutarlo un proceso a la vez (ver SendNotificationsCronJob).
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_BATCH_SIZE
+    client = room_cache.get_sync_client()
+
+    raw = client.lrange(PROCESSING_KEY, 0, -1)
+    if not raw:
+        with client.pipeline(transaction=False) as pipe:
+            for _ in range(batch_size):
+                pipe.lmove(QUEUE_KEY, PROCESSING_KEY, 'LEFT', 'RIGHT')
+            raw = [item for item in pipe.execute() if item is not None]
+        if not raw:
+            return 0
+
+    if client.incr(ATTEMPTS_KEY) > settings.NOTIFICATIONS_MAX_ATTEMPTS:
+        # No dejamos que un lote que siempre falla bloquee la cola
+        print(f"    > ERROR: {len(raw)} emails han fallado demasiadas veces, se apartan en '{FAILED_KEY}'")
+        _finish(client, move_to=FAILED_KEY, items=raw)
+        return 0
+
+    _send([json.loads(item) for item in raw])
+    _finish(client)
+    return len(raw)
+
+
+def _finish(client, move_to=None, items=()):
+    # Vacía el lote en proceso (y opcionalmente lo guarda en otra lista)
+    with client.pipeline(transaction=True) as pipe:
+        if move_to:
+            pipe.rpush(move_to, *items)
+        pipe.delete(PROCESSING_KEY, ATTEMPTS_KEY)
+        pipe.execute()
@@ -41,4 +41,7 @@ class IsOwnerOrStaffReadOnly(permissions.BasePermission):
         
         # Si el método es de escritura (PUT, DELETE),
         # solo permite si el usuario es el 'dueño' del objeto O un admin.
-        return obj.owner == request.user or request.user.is_superuser
\ No newline at end of file
+        # Comparamos IDs (`owner_id`) para no cargar el User de la BBDD.
+        # Los objetos sin 'owner' propio (como TimeSlot) deben traer `owner_id`
+        # anotado en el queryset del ViewSet.
+        return request.user.is_superuser or obj.owner_id == request.user.id
\ No newline at end of file
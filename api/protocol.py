@@ -0,0 +1,58 @@
+# api/protocol.py
+
+import json
+import msgpack
+
+# Subprotocolo binario que el cliente puede pedir en `Sec-WebSocket-Protocol`.
+# Si no lo pide, seguimos usando JSON en frames de texto.
+MSGPACK_SUBPROTOCOL = 'talkabout.msgpack.v1'
+
+# Eventos servidor -> cliente: código corto y campos (en orden) del frame binario.
+# Un frame binario es un array msgpack: [código, campo1, campo2, ...]
+SERVER_EVENTS = {
+    'connection_established': (0, ('room_id',)),
+    'countdown': (1, ('time_left',)),
+    'redirect': (2, ('url',)),
+    'ping': (3, ()),
+}
+
+# Eventos cliente -> servidor.
+CLIENT_EVENTS = {
+    10: 'user_joined',
+    11: 'pong',
+}
+
+
+def encode_json(event_type, data):
+    return json.dumps({'type': event_type, **data})
+
+
+def encode_msgpack(event_type, data):
+    code, fields = SERVER_EVENTS[event_type]
+    return msgpack.packb([code, *(data[field] for field in fields)])
+
+
+def decode_msgpack(frame):
+    """
+    Decodifica un frame binario del servidor (lo usan los clientes y el benchmark).
+    """
+    code, *values = msgpack.unpackb(frame)
+    for event_type, (event_code, fields) in SERVER_EVENTS.items():
+        if event_code == code:
+            return {'type': event_type, **dict(zip(fields, values))}
+    raise ValueError(f'Código de evento desconocido: {code}')
+
+
+def decode_client_message(text_data=None, bytes_data=None):
+    """
+    Devuelve el mensaje del cliente como diccionario, venga en JSON o en msgpack.
+    Si el mensaje está mal formado, devuelve None.
+    """
+    try:
+        if bytes_data is not None:
+            code, *_ = msgpack.unpackb(bytes_data)
+            return {'type': CLIENT_EVENTS.get(code)}
+        data = json.loads(text_data)
+    except (ValueError, TypeError, msgpack.UnpackException):
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,220 @@
+# api/room_cache.py
+
+import json
+import time
+import redis
+from django.conf import settings
+
+# Claves en Redis para cada sala de espera precargada.
+ROOM_KEY = 'waiting_room:{}:meta'
+USERS_KEY = 'waiting_room:{}:users'
+
+# Contadores para medir cuántas lecturas a la BBDD nos ahorramos.
+STATS_HITS_KEY = 'waiting_room:stats:cache_hits'
+STATS_MISSES_KEY = 'waiting_room:stats:cache_misses'
+STATS_PREWARMED_KEY = 'waiting_room:stats:prewarmed'
+# Hash con los contadores de conexiones (pings, desconexiones forzadas, etc.)
+STATS_CONNECTIONS_KEY = 'waiting_room:stats:connections'
+COUNTDOWN_LOCK_KEY = 'waiting_room:{}:countdown'
+# Conexiones abiertas en cada sala: hash canal -> JSON [user_id o null, última señal de vida]
+PRESENCE_KEY = 'waiting_room:{}:present'
+# Orden de llegada de las conexiones que no están en el reparto de una llamada
+ARRIVALS_KEY = 'waiting_room:{}:arrivals:{}'
+
+_sync_client = None
+_async_client = None
+
+
+def get_sync_client():
+    """
+    Cliente de Redis síncrono (para el cron y las vistas).
+    """
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    return _sync_client
+
+
+def get_async_client():
+    """
+    Cliente de Redis asíncrono (para los consumers).
+    """
+    global _async_client
+    if _async_client is None:
+        # Import aquí: redis.asyncio solo lo usan los procesos de websockets
+        from redis import asyncio as aioredis
+        _async_client = aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    return _async_client
+
+
+def build_room_state(slot, user_ids):
+    """
+    Construye el estado de la sala a partir de una convocatoria
+    (con su actividad ya cargada) y los IDs de los inscritos.
+    """
+    return {
+        'timeslot_id': slot.id,
+        'activity_id': slot.activity_id,
+        'title': slot.activity.title,
+        'max_participants': slot.activity.max_participants,
+        'start_time': slot.start_time.timestamp(),
+        'end_time': slot.end_time.timestamp(),
+        # La cuenta atrás termina a la hora de inicio de la convocatoria.
+        'deadline': slot.start_time.timestamp(),
+        'user_ids': sorted(user_ids),
+    }
+
+
+def store_room_state(pipe, state, ttl):
+    """
+    Añade al pipeline las escrituras de una sala. No ejecuta el pipeline.
+    """
+    timeslot_id = state['timeslot_id']
+    meta = {k: v for k, v in state.items() if k != 'user_ids'}
+    pipe.set(ROOM_KEY.format(timeslot_id), json.dumps(meta), ex=ttl)
+    users_key = USERS_KEY.format(timeslot_id)
+    pipe.delete(users_key)
+    if state['user_ids']:
+        pipe.sadd(users_key, *state['user_ids'])
+    pipe.expire(users_key, ttl)
+
+
+def add_room_user(timeslot_id, user_id):
+    """
+    Añade un inscrito a una sala ya precargada (con la misma caducidad).
+    Si la sala no está en Redis no hace nada: se leerá de la BBDD o
+    la precargará el próximo cron.
+    """
+    client = get_sync_client()
+    users_key = USERS_KEY.format(timeslot_id)
+    try:
+        ttl = client.ttl(ROOM_KEY.format(timeslot_id))
+        if ttl <= 0:
+            return
+        with client.pipeline(transaction=False) as pipe:
+            pipe.sadd(users_key, user_id)
+            pipe.expire(users_key, ttl)
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"    > ERROR al actualizar la sala {timeslot_id}: {e}")
+
+
+def remove_room_user(timeslot_id, user_id):
+    # Quita un inscrito de la sala precargada (si no está, SREM no hace nada)
+    try:
+        get_sync_client().srem(USERS_KEY.format(timeslot_id), user_id)
+    except redis.RedisError as e:
+        print(f"    > ERROR al actualizar la sala {timeslot_id}: {e}")
+
+
+def invalidate_rooms(timeslot_ids):
+    """
+    Borra las salas precargadas de esas convocatorias (p.ej. porque han
+    cambiado de hora o se han borrado). Se vuelven a leer de la BBDD.
+    """
+    if not timeslot_ids:
+        return
+    try:
+        with get_sync_client().pipeline(transaction=False) as pipe:
+            for timeslot_id in timeslot_ids:
+                pipe.delete(ROOM_KEY.format(timeslot_id), USERS_KEY.format(timeslot_id))
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"    > ERROR al invalidar {len(timeslot_ids)} salas: {e}")
+
+
+async def load_room_state(timeslot_id):
+    """
+    Lee el estado de una sala precargada. Devuelve None si no está en Redis.
+    """
+    client = get_async_client()
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.get(ROOM_KEY.format(timeslot_id))
+        pipe.smembers(USERS_KEY.format(timeslot_id))
+        meta, members = await pipe.execute()
+
+    if meta is None:
+        await client.incr(STATS_MISSES_KEY)
+        return None
+
+    await client.incr(STATS_HITS_KEY)
+    state = json.loads(meta)
+    state['user_ids'] = sorted(int(m) for m in members)
+    return state
+
+
+async def incr_connection_stat(name, amount=1):
+    await get_async_client().hincrby(STATS_CONNECTIONS_KEY, name, amount)
+
+
+async def acquire_countdown_lock(timeslot_id, ttl):
+    """
+    Devuelve True solo para el primero que lo pida: así la cuenta atrás
+    de una sala se lanza una única vez, aunque haya varios workers.
+    """
+    return bool(await get_async_client().set(COUNTDOWN_LOCK_KEY.format(timeslot_id), 1, nx=True, ex=ttl))
+
+
+async def mark_present(timeslot_id, channel_name, user_id, ttl=6 * 3600):
+    """
+    Apunta (o refresca) una conexión abierta en la sala. Lo llaman `connect`
+    y cada vuelta del heartbeat, así que las de workers caídos se quedan viejas.
+    """
+    key = PRESENCE_KEY.format(timeslot_id)
+    async with get_async_client().pipeline(transaction=False) as pipe:
+        pipe.hset(key, channel_name, json.dumps([user_id, time.time()]))
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def mark_absent(timeslot_id, channel_name):
+    await get_async_client().hdel(PRESENCE_KEY.format(timeslot_id), channel_name)
+
+
+async def get_present(timeslot_id, max_age):
+    """
+    Conexiones con señales de vida en los últimos `max_age` segundos:
+    {canal: user_id (o None si es anónimo)}.
+    """
+    entries = await get_async_client().hgetall(PRESENCE_KEY.format(timeslot_id))
+    oldest = time.time() - max_age
+    present = {}
+    for channel_name, value in entries.items():
+        user_id, seen_at = json.loads(value)
+        if seen_at >= oldest:
+            present[channel_name.decode()] = user_id
+    return present
+
+
+async def release_countdown_lock(timeslot_id):
+    # Si la cuenta atrás falla, otro usuario de la sala puede volver a lanzarla
+    await get_async_client().delete(COUNTDOWN_LOCK_KEY.format(timeslot_id))
+
+
+async def next_arrival(timeslot_id, launch_id, ttl=3600):
+    """
+    Posición (0, 1, 2...) de la siguiente conexión sin plaza asignada
+    en el lanzamiento `launch_id`. Es la misma para todos los workers.
+    """
+    key = ARRIVALS_KEY.format(timeslot_id, launch_id)
+    async with get_async_client().pipeline(transaction=True) as pipe:
+        pipe.incr(key)
+        pipe.expire(key, ttl)
+        position, _ = await pipe.execute()
+    return position - 1
+
+
+def get_stats():
+    """
+    Devuelve los contadores de precarga (aciertos, fallos y salas precargadas)
+    y los de conexiones de las salas de espera.
+    """
+    client = get_sync_client()
+    hits, misses, prewarmed = client.mget(STATS_HITS_KEY, STATS_MISSES_KEY, STATS_PREWARMED_KEY)
+    connections = client.hgetall(STATS_CONNECTIONS_KEY)
+    return {
+        'cache_hits': int(hits or 0),
+        'cache_misses': int(misses or 0),
+        'prewarmed': int(prewarmed or 0),
+        'connections': {k.decode(): int(v) for k, v in connections.items()},
+    }
@@ -0,0 +1,76 @@
+# api/search.py
+
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import Activity, TimeSlot
+
+SEARCH_CONFIG = 'spanish'
+
+
+def build_prefix_query(text):
+    """
+    Convierte el texto del usuario en una consulta de PostgreSQL en la que
+    cada palabra se busca como prefijo: "conver ingl" -> "conver:* & ingl:*".
+    Devuelve None si no hay ninguna palabra.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_activities(text='', upcoming=False, free_seats=False):
+    """
+    Busca actividades por título/descripción, ordenadas por relevancia.
+
+    Devuelve (queryset, facets). facets['count'] es el número de resultados
+    con los filtros aplicados. Si hay texto, facets también cuenta, sobre
+    todas sus coincidencias, cuántas tienen convocatorias futuras y cuántas
+    tienen plazas libres en alguna de ellas. Sin texto, esas dos son None:
+    serían dos EXISTS por cada actividad de la tabla en cada petición.
+    """
+    now = timezone.now()
+    upcoming_slots = TimeSlot.objects.filter(activity=OuterRef('pk'), start_time__gte=now)
+    slots_with_seats = (
+        upcoming_slots
+        .annotate(enrolled=Count('enrollments'))
+        .filter(enrolled__lt=OuterRef('max_participants'))
+    )
+
+    activities = Activity.objects.defer('search_vector').annotate(
+        has_upcoming_slots=Exists(upcoming_slots),
+        has_free_seats=Exists(slots_with_seats),
+    )
+
+    filters = Q()
+    if upcoming:
+        filters &= Q(has_upcoming_slots=True)
+    if free_seats:
+        filters &= Q(has_free_seats=True)
+
+    query = build_prefix_query(text)
+    if query is not None:
+        activities = (
+            activities
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', 'id')
+        )
+        # Resultados y facetas en un único recorrido de las coincidencias
+        facets = activities.aggregate(
+            count=Count('id', filter=filters),
+            has_upcoming_slots=Count('id', filter=Q(has_upcoming_slots=True)),
+            has_free_seats=Count('id', filter=Q(has_free_seats=True)),
+        )
+    else:
+        activities = activities.order_by('id')
+        facets = {
+            'count': activities.filter(filters).count(),
+            'has_upcoming_slots': None,
+            'has_free_seats': None,
+        }
+
+    return activities.filter(filters), facets
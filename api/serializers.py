@@ -1,7 +1,9 @@
 # api/serializers.py
 
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, Activity, ActivityFile, TimeSlot, Enrollment
+from .models import User, Activity, ActivityFile, TimeSlot, Enrollment, ArchivedTimeSlot, ArchivedEnrollment
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -37,4 +39,59 @@ class TimeSlotSerializer(serializers.ModelSerializer):
 class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
-        fields = ['id', 'user', 'timeslot', 'attended', 'enrolled_at']
\ No newline at end of file
+        fields = ['id', 'user', 'timeslot', 'attended', 'enrolled_at']
+
+
+# Mismo formato que TimeSlotSerializer / EnrollmentSerializer, para el histórico.
+class ArchivedTimeSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedTimeSlot
+        fields = ['id', 'activity', 'start_time', 'end_time']
+
+
+class ArchivedEnrollmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedEnrollment
+        fields = ['id', 'user', 'timeslot', 'attended', 'enrolled_at']
+
+
+# -------------------------------------------------
+# SERIALIZACIÓN RÁPIDA (sin ModelSerializer)
+# -------------------------------------------------
+
+def _format_datetime(value):
+    # Igual que serializers.DateTimeField con el formato ISO 8601 por defecto
+    if value is None:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def fast_serialize(queryset, serializer_class):
+    """
+    Devuelve lo mismo que `serializer_class(queryset, many=True).data`,
+    pero leyendo con `.values_list()` y sin crear instancias del modelo.
+
+    Solo sirve para serializers "planos" (como TimeSlotSerializer o
+    EnrollmentSerializer): todos los campos son columnas del modelo,
+    y las ForeignKey se devuelven como su ID.
+    """
+    model = serializer_class.Meta.model
+    fields = list(serializer_class.Meta.fields)
+
+    converters = []
+    for name in fields:
+        if isinstance(model._meta.get_field(name), models.DateTimeField):
+            converters.append(_format_datetime)
+        else:
+            converters.append(None)
+
+    results = []
+    for row in queryset.values_list(*fields):
+        results.append({
+            name: convert(value) if convert else value
+            for name, convert, value in zip(fields, converters, row)
+        })
+    return results
\ No newline at end of file
@@ -0,0 +1,19 @@
+# api/signals.py
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Activity, ActivityStats
+
+
+# Marcamos como 'dirty' las estadísticas de la actividad con un único UPDATE.
+# El recálculo lo hace `manage.py refresh_activity_stats`.
+# Nota: para TimeSlot y Enrollment NO hay señales: bloquearían el borrado rápido
+# en cascada (un UPDATE por fila) y añadirían una escritura a cada inscripción.
+# Las vistas que las cambian marcan las estadísticas una vez por operación.
+
+@receiver(post_save, sender=Activity)
+def activity_changed(sender, instance, created, **kwargs):
+    # Solo nos importa si cambia `max_participants` (la capacidad)
+    if not created:
+        ActivityStats.objects.filter(activity_id=instance.id).update(dirty=True)
@@ -0,0 +1,95 @@
+# api/stats.py
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Activity, ActivityStats
+
+STAT_FIELDS = ['total_slots', 'finished_slots', 'capacity', 'enrollments', 'finished_enrollments', 'attended']
+
+
+def compute_stats(activity_ids, now=None):
+    """
+    Calcula las estadísticas "en vivo" (con JOINs) de las actividades indicadas,
+    sumando las convocatorias vivas y las archivadas.
+    Devuelve {activity_id: {campo: valor}}.
+    """
+    now = now or timezone.now()
+    live = Activity.objects.filter(id__in=activity_ids).annotate(
+        total_slots=Count('timeslots', distinct=True),
+        finished_slots=Count('timeslots', filter=Q(timeslots__end_time__lte=now), distinct=True),
+        enrollments=Count('timeslots__enrollments'),
+        finished_enrollments=Count('timeslots__enrollments', filter=Q(timeslots__end_time__lte=now)),
+        attended=Count('timeslots__enrollments', filter=Q(timeslots__enrollments__attended=True)),
+    ).values('id', 'max_participants', 'total_slots', 'finished_slots', 'enrollments', 'finished_enrollments', 'attended')
+
+    # Las archivadas ya han terminado todas
+    archived = Activity.objects.filter(id__in=activity_ids, archived_timeslots__isnull=False).annotate(
+        total_slots=Count('archived_timeslots', distinct=True),
+        enrollments=Count('archived_timeslots__enrollments'),
+        attended=Count('archived_timeslots__enrollments', filter=Q(archived_timeslots__enrollments__attended=True)),
+    ).values('id', 'total_slots', 'enrollments', 'attended')
+    archived = {row['id']: row for row in archived}
+
+    results = {}
+    for row in live:
+        old = archived.get(row['id'], {'total_slots': 0, 'enrollments': 0, 'attended': 0})
+        total_slots = row['total_slots'] + old['total_slots']
+        results[row['id']] = {
+            'total_slots': total_slots,
+            'finished_slots': row['finished_slots'] + old['total_slots'],
+            'capacity': total_slots * row['max_participants'],
+            'enrollments': row['enrollments'] + old['enrollments'],
+            'finished_enrollments': row['finished_enrollments'] + old['enrollments'],
+            'attended': row['attended'] + old['attended'],
+        }
+    return results
+
+
+def refresh_stats(full=False):
+    """
+    Recalcula ActivityStats. Sin `full`, solo las actividades que lo necesitan:
+    - sin fila de estadísticas todavía,
+    - marcadas como `dirty` (por las vistas que cambian convocatorias o inscripciones),
+    - o con alguna convocatoria que ha terminado desde el último refresco.
+    Devuelve el número de actividades recalculadas.
+    """
+    now = timezone.now()
+    targets = Activity.objects.all()
+    if not full:
+        targets = targets.filter(
+            Q(stats__isnull=True)
+            | Q(stats__dirty=True)
+            | Q(timeslots__end_time__gt=F('stats__refreshed_at'), timeslots__end_time__lte=now)
+        )
+    activity_ids = list(targets.values_list('id', flat=True).distinct())
+    if not activity_ids:
+        return 0
+
+    # Limpiamos `dirty` ANTES de calcular: si algo cambia mientras tanto,
+    # se volverá a marcar y se recalculará en el siguiente refresco.
+    ActivityStats.objects.filter(activity_id__in=activity_ids).update(dirty=False)
+
+    results = compute_stats(activity_ids, now)
+    ActivityStats.objects.bulk_create(
+        [ActivityStats(activity_id=activity_id, refreshed_at=now, **values) for activity_id, values in results.items()],
+        update_conflicts=True,
+        unique_fields=['activity'],
+        update_fields=STAT_FIELDS + ['refreshed_at'],
+    )
+    return len(results)
+
+
+def stats_to_dict(values):
+    """
+    Formato de la API: los contadores y las tasas derivadas de ellos.
+    """
+    no_shows = values['finished_enrollments'] - values['attended']
+    return {
+        **{field: values[field] for field in STAT_FIELDS},
+        'no_shows': no_shows,
+        'fill_rate': round(values['enrollments'] / values['capacity'], 4) if values['capacity'] else None,
+        'attendance_rate': (
+            round(values['attended'] / values['finished_enrollments'], 4) if values['finished_enrollments'] else None
+        ),
+    }
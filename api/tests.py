@@ -1,3 +1,771 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core import mail
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import room_cache
+from . import events
+from . import fanout
+from . import notifications
+from .consumers import WaitingRoomConsumer
+from .cron import SendReminderCronJob
+from .locks import advisory_lock
+from .models import User, Activity, TimeSlot, Enrollment, ArchivedTimeSlot, ArchivedEnrollment, ActivityStats
+from .routing import websocket_urlpatterns
+from .serializers import TimeSlotSerializer, EnrollmentSerializer, fast_serialize, _format_datetime
+from .stats import compute_stats, refresh_stats
+
+
+def create_user(name, **extra):
+    return User.objects.create(username=name, edx_user_id=name, email=f'{name}@example.com', **extra)
+
+
+def run_in_thread(target):
+    # Ejecuta `target` en otro hilo, es decir, con otra conexión a la BBDD (como otro nodo)
+    result = {}
+
+    def run():
+        try:
+            result['value'] = target()
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result.get('value')
+
+
+# -------------------------------------------------
+# SALA DE ESPERA (WaitingRoomConsumer)
+# -------------------------------------------------
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    WAITING_ROOM_HEARTBEAT_SECONDS=0.05,
+    WAITING_ROOM_IDLE_TIMEOUT_SECONDS=0.2,
+    WAITING_ROOM_INBOUND_RATE=0,
+    WAITING_ROOM_INBOUND_BURST=2,
+    WAITING_ROOM_MAX_PENDING_SENDS=3,
+)
+class WaitingRoomConsumerTests(SimpleTestCase):
+    """
+    Control de la conexión: desconexión por inactividad, por no leer
+    los mensajes (cola llena) y límite de mensajes entrantes.
+    Los contadores y eventos de Redis se sustituyen por mocks.
+    """
+
+    GROUP = 'waiting_room_1'
+
+    def setUp(self):
+        self.stats = mock.patch.object(room_cache, 'incr_connection_stat', new=mock.AsyncMock())
+        self.incr_connection_stat = self.stats.start()
+        self.addCleanup(self.stats.stop)
+        for module, name in ((events, 'aemit'), (room_cache, 'mark_present'), (room_cache, 'mark_absent')):
+            patcher = mock.patch.object(module, name, new=mock.AsyncMock())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), 'ws/waitroom/1/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def stat_calls(self, name):
+        return [c for c in self.incr_connection_stat.await_args_list if c.args == (name,)]
+
+    async def test_idle_client_is_reaped_and_leaves_group(self):
+        communicator = await self.connect()
+        layer = get_channel_layer()
+        self.assertEqual(len(layer.groups[self.GROUP]), 1)
+
+        # No respondemos a los 'ping': al pasar el timeout se cierra con 4000
+        while True:
+            output = await communicator.receive_output(timeout=1)
+            if output['type'] == 'websocket.close':
+                break
+        self.assertEqual(output['code'], 4000)
+        self.assertFalse(layer.groups.get(self.GROUP))
+        self.assertEqual(len(self.stat_calls('reaped_idle')), 1)
+        await communicator.disconnect()
+
+    async def test_slow_consumer_is_reaped_when_outbox_is_full(self):
+        async def stalled_writer(consumer):
+            # Simula un cliente que no lee: la cola de salida nunca se vacía
+            await asyncio.Event().wait()
+
+        with mock.patch.object(WaitingRoomConsumer, 'writer', stalled_writer):
+            communicator = await self.connect()
+            layer = get_channel_layer()
+            for time_left in range(5, 0, -1):
+                await layer.group_send(self.GROUP, {'type': 'countdown_tick', 'time_left': time_left})
+
+            output = await communicator.receive_output(timeout=1)
+            self.assertEqual(output, {'type': 'websocket.close', 'code': 4000})
+            self.assertFalse(layer.groups.get(self.GROUP))
+            self.assertEqual(len(self.stat_calls('reaped_slow_consumer')), 1)
+            await communicator.disconnect()
+
+    async def test_inbound_messages_are_rate_limited(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()  # connection_established
+
+        # Ráfaga de 2 y sin recarga: de 5 mensajes, 3 se descartan
+        for _ in range(5):
+            await communicator.send_to(text_data=json.dumps({'type': 'pong'}))
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(len(self.stat_calls('rate_limited')), 3)
+        await communicator.disconnect()
+
+
+# -------------------------------------------------
+# REPARTO DE LA LLAMADA (api/fanout.py)
+# -------------------------------------------------
+
+class FanoutTests(SimpleTestCase):
+
+    def test_split_into_groups_is_balanced(self):
+        self.assertEqual(fanout.split_into_groups([1, 2, 3, 4, 5], 4), [[1, 2, 3], [4, 5]])
+        self.assertEqual(fanout.split_into_groups([1, 2, 3, 4], 4), [[1, 2, 3, 4]])
+        self.assertEqual(fanout.split_into_groups([1, 2, 3], 0), [[1], [2], [3]])
+        self.assertEqual(fanout.split_into_groups([], 4), [])
+
+    def test_only_present_users_are_grouped(self):
+        # 8 inscritos, máximo 4, y solo se presentan el 1 y el 8: misma sala
+        participants = fanout.order_participants(['8', '1'], range(1, 9))
+        self.assertEqual(participants, ['1', '8'])
+        event = fanout.build_call_assignments(1, participants, 4)
+        self.assertEqual(len(event['rooms']), 1)
+        self.assertEqual(fanout.resolve_call_url(event, '1'), fanout.resolve_call_url(event, '8'))
+
+    def test_order_participants_puts_enrolled_first_without_duplicates(self):
+        keys = ['anon:b', '3', 'anon:a', '3', '7']
+        self.assertEqual(fanout.order_participants(keys, [7, 3, 9]), ['7', '3', 'anon:a', 'anon:b'])
+
+    def test_resolve_call_url(self):
+        event = fanout.build_call_assignments(1, ['1', '2', '3', '4', '5'], 4)
+        self.assertEqual(fanout.resolve_call_url(event, '5'), event['rooms'][1])
+        self.assertIsNone(fanout.resolve_call_url(event, '99'))
+
+    def test_late_arrivals_fill_free_seats_then_join_existing_rooms(self):
+        # Salas de 3 y 2 con máximo 4: quedan 1 + 2 plazas libres
+        event = fanout.build_call_assignments(1, ['1', '2', '3', '4', '5'], 4)
+        rooms = event['rooms']
+        urls = [fanout.assign_by_arrival(event, position) for position in range(5)]
+        self.assertEqual(urls[:3], [rooms[0], rooms[1], rooms[1]])
+        # Sin plazas: a las salas que ya hay, nunca a una nueva
+        self.assertEqual(set(urls[3:]), set(rooms))
+
+
+# -------------------------------------------------
+# CRON DE RECORDATORIOS (SendReminderCronJob)
+# -------------------------------------------------
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    REMINDER_CRON_SHARDS=1,
+    REMINDER_CRON_SHARD_INDEX=0,
+)
+class SendReminderCronJobTests(TransactionTestCase):
+    """
+    Varios nodos con `runcrons`: el advisory lock es por conexión,
+    así que cada "nodo" se simula con un hilo (su propia conexión).
+    """
+
+    def setUp(self):
+        emit_many = mock.patch.object(events, 'emit_many')
+        emit_many.start()
+        self.addCleanup(emit_many.stop)
+
+        owner = create_user('owner', is_staff=True)
+        activity = Activity.objects.create(owner=owner, title='Conversación', description='')
+        start = timezone.now() + timedelta(minutes=45)
+        self.slot = TimeSlot.objects.create(activity=activity, start_time=start, end_time=start + timedelta(hours=1))
+        for name in ('alumno1', 'alumno2'):
+            Enrollment.objects.create(user=create_user(name), timeslot=self.slot)
+
+    def test_only_one_connection_gets_the_lock(self):
+        def try_lock():
+            with advisory_lock(SendReminderCronJob.code, 0) as acquired:
+                return acquired
+
+        with advisory_lock(SendReminderCronJob.code, 0) as acquired:
+            self.assertTrue(acquired)
+            self.assertFalse(run_in_thread(try_lock))
+            # Mientras tengamos el lock, el otro nodo no envía nada
+            run_in_thread(lambda: SendReminderCronJob().do())
+            self.assertEqual(len(mail.outbox), 0)
+
+        self.assertTrue(run_in_thread(try_lock))
+
+    def test_concurrent_nodes_send_one_set_of_emails(self):
+        barrier = threading.Barrier(2)
+
+        def node():
+            barrier.wait()
+            SendReminderCronJob().do()
+
+        threads = [threading.Thread(target=lambda: run_in_thread(node)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['alumno1@example.com', 'alumno2@example.com'])
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.reminder_sent)
+
+    def test_claim_is_idempotent_across_shard_configurations(self):
+        # Dos nodos que no comparten lock (p.ej. uno con 1 shard y otro con 2)
+        SendReminderCronJob().send_reminders(1, 0)
+        SendReminderCronJob().send_reminders(2, self.slot.id % 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+# -------------------------------------------------
+# SERIALIZACIÓN RÁPIDA (fast_serialize)
+# -------------------------------------------------
+
+class FastSerializeContractTests(TestCase):
+    """
+    `fast_serialize` tiene que devolver exactamente los mismos bytes
+    que el ModelSerializer, también con otra zona horaria.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin', is_staff=True, is_superuser=True)
+        activity = Activity.objects.create(owner=cls.admin, title='Conversación', description='')
+        # Con microsegundos y en distintos días (y a ambos lados del cambio de hora)
+        start = timezone.now().replace(month=3, day=30, hour=0, minute=30, microsecond=123456)
+        for days in (0, 1, 200):
+            slot = TimeSlot.objects.create(
+                activity=activity,
+                start_time=start + timedelta(days=days),
+                end_time=start + timedelta(days=days, hours=1),
+            )
+            Enrollment.objects.create(user=create_user(f'alumno{days}'), timeslot=slot)
+
+    def assert_same_bytes(self, queryset, serializer_class):
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(fast_serialize(queryset, serializer_class)),
+            renderer.render(serializer_class(queryset, many=True).data),
+        )
+
+    def test_same_bytes_as_model_serializer(self):
+        for time_zone in ('UTC', 'Europe/Madrid', 'America/Sao_Paulo'):
+            with self.subTest(time_zone=time_zone), override_settings(TIME_ZONE=time_zone):
+                self.assert_same_bytes(TimeSlot.objects.order_by('id'), TimeSlotSerializer)
+                self.assert_same_bytes(Enrollment.objects.order_by('id'), EnrollmentSerializer)
+
+    def test_datetime_format_matches_drf(self):
+        field = drf_serializers.DateTimeField()
+        values = [None, timezone.now(), timezone.now().replace(microsecond=0)]
+        for time_zone in ('UTC', 'Europe/Madrid'):
+            with self.subTest(time_zone=time_zone), override_settings(TIME_ZONE=time_zone):
+                for value in values:
+                    self.assertEqual(_format_datetime(value), field.to_representation(value))
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_fast_list_is_opt_in_and_identical(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for basename in ('timeslot', 'enrollment'):
+            with self.subTest(basename=basename):
+                normal = client.get(reverse(f'{basename}-list'))
+                fast = client.get(reverse(f'{basename}-list'), {'fast': 'true'})
+                self.assertEqual(normal.status_code, 200)
+                self.assertEqual(fast.content, normal.content)
+
+
+# -------------------------------------------------
+# INSCRIPCIONES POR ROL (EnrollmentViewSet)
+# -------------------------------------------------
+
+class EnrollmentScopeTests(TestCase):
+    """
+    Cada rol ve solo sus filas, en una única query, y el listado
+    de una convocatoria usa el índice (timeslot, attended).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin', is_staff=True, is_superuser=True)
+        cls.teacher = create_user('profe', is_staff=True)
+        other_teacher = create_user('otro_profe', is_staff=True)
+        cls.student1 = create_user('alumno1')
+        cls.student2 = create_user('alumno2')
+
+        day = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=10)
+        own = Activity.objects.create(owner=cls.teacher, title='Propia', description='')
+        other = Activity.objects.create(owner=other_teacher, title='Ajena', description='')
+        cls.own_slot = TimeSlot.objects.create(activity=own, start_time=day, end_time=day + timedelta(hours=1))
+        other_slot = TimeSlot.objects.create(
+            activity=other, start_time=day + timedelta(days=1), end_time=day + timedelta(days=1, hours=1)
+        )
+        cls.day = day
+
+        Enrollment.objects.create(user=cls.student1, timeslot=cls.own_slot)
+        Enrollment.objects.create(user=cls.student1, timeslot=other_slot)
+        Enrollment.objects.create(user=cls.student2, timeslot=other_slot)
+        # El profesor también puede inscribirse en actividades ajenas
+        Enrollment.objects.create(user=cls.teacher, timeslot=other_slot, attended=True)
+
+    def list_as(self, user, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertNumQueries(1):
+            response = client.get(reverse('enrollment-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rows_per_role(self):
+        expected = {self.admin: 4, self.teacher: 2, self.student1: 2, self.student2: 1}
+        for user, count in expected.items():
+            with self.subTest(user=user.username):
+                self.assertEqual(len(self.list_as(user)), count)
+
+    def test_date_filters_include_whole_days(self):
+        first_day = f'{self.day:%Y-%m-%d}'
+        self.assertEqual(len(self.list_as(self.admin, start_date=first_day, end_date=first_day)), 1)
+        self.assertEqual(len(self.list_as(self.admin, end_date=first_day)), 1)
+        self.assertEqual(len(self.list_as(self.admin, start_date=f'{self.day + timedelta(days=1):%Y-%m-%d}')), 3)
+
+    def test_invalid_filter_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse('enrollment-list'), {'start_date': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_timeslot_queries_use_the_index(self):
+        # Con tan pocas filas el planificador prefiere leer la tabla entera: se lo quitamos
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        queryset = Enrollment.objects.filter(timeslot_id=self.own_slot.id, attended=True)
+        self.assertIn('enrollment_timeslot_att_idx', queryset.explain())
+        self.assertNotIn('Seq Scan', Enrollment.objects.filter(timeslot_id=self.own_slot.id).order_by('timeslot_id', 'user_id').explain())
+
+
+# -------------------------------------------------
+# CONVOCATORIAS (TimeSlotViewSet y create_bulk_slots)
+# -------------------------------------------------
+
+class TimeSlotQueryCountTests(TestCase):
+    """
+    El permiso de 'dueño' se comprueba con el `owner_id` anotado en la
+    misma query: ni la actividad ni su dueño se cargan aparte.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('profe', is_staff=True)
+        cls.other = create_user('otro_profe', is_staff=True)
+        cls.activity = Activity.objects.create(owner=cls.owner, title='Conversación', description='')
+        start = timezone.now() + timedelta(days=3)
+        cls.slot = TimeSlot.objects.create(activity=cls.activity, start_time=start, end_time=start + timedelta(hours=1))
+
+    def setUp(self):
+        invalidate_rooms = mock.patch.object(room_cache, 'invalidate_rooms')
+        invalidate_rooms.start()
+        self.addCleanup(invalidate_rooms.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_retrieve(self):
+        # Solo el SELECT de la convocatoria (con owner_id)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('timeslot-detail', args=[self.slot.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_update(self):
+        # SELECT + UPDATE + marcar las estadísticas de la actividad
+        new_start = self.slot.start_time + timedelta(hours=1)
+        with self.assertNumQueries(3):
+            response = self.client.patch(
+                reverse('timeslot-detail', args=[self.slot.id]),
+                {'start_time': new_start.isoformat(), 'end_time': (new_start + timedelta(hours=1)).isoformat()},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_by_other_teacher_is_forbidden(self):
+        self.client.force_authenticate(self.other)
+        with self.assertNumQueries(1):
+            response = self.client.patch(reverse('timeslot-detail', args=[self.slot.id]), {}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_destroy(self):
+        # SELECT + DELETE rápido de las inscripciones en cascada + DELETE + marcar las estadísticas
+        with self.assertNumQueries(4):
+            response = self.client.delete(reverse('timeslot-detail', args=[self.slot.id]))
+        self.assertEqual(response.status_code, 204)
+
+    def test_create_bulk_slots(self):
+        # SELECT de la actividad, un INSERT por convocatoria y marcar las estadísticas una vez
+        data = {
+            'start_date': '2030-01-07',  # lunes
+            'end_date': '2030-01-13',
+            'start_time': '14:00',
+            'end_time': '15:00',
+            'weekdays': [0, 2, 4],
+        }
+        with self.assertNumQueries(1 + 3 + 1):
+            response = self.client.post(
+                reverse('activity-create-bulk-slots', args=[self.activity.id]), data, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['slots']), 3)
+
+
+# -------------------------------------------------
+# HISTÓRICO (archivado + tabla viva)
+# -------------------------------------------------
+
+class HistoryTests(TestCase):
+    """
+    El histórico mezcla por hora de inicio lo archivado y lo vivo, aunque
+    lo archivado no sea siempre lo más antiguo, y exige un rango acotado.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('profe', is_staff=True)
+        cls.student = create_user('alumno')
+        activity = Activity.objects.create(owner=cls.owner, title='Conversación', description='')
+        cls.base = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=30)
+
+        # Viva: días 0 y 2. Archivada (con otro --days): día 1
+        for days in (0, 2):
+            start = cls.base + timedelta(days=days)
+            slot = TimeSlot.objects.create(activity=activity, start_time=start, end_time=start + timedelta(hours=1))
+            Enrollment.objects.create(user=cls.student, timeslot=slot)
+        start = cls.base + timedelta(days=1)
+        archived = ArchivedTimeSlot.objects.create(
+            id=TimeSlot.objects.order_by('-id').first().id + 100,
+            activity=activity, start_time=start, end_time=start + timedelta(hours=1),
+        )
+        ArchivedEnrollment.objects.create(
+            id=Enrollment.objects.order_by('-id').first().id + 100,
+            user=cls.student, timeslot=archived, enrolled_at=start,
+        )
+
+    def get(self, user, basename, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse(f'{basename}-history'), params)
+
+    def full_range(self):
+        return {'start_date': f'{self.base:%Y-%m-%d}', 'end_date': f'{self.base + timedelta(days=2):%Y-%m-%d}'}
+
+    def test_timeslots_are_merged_by_start_time(self):
+        response = self.get(self.owner, 'timeslot', **self.full_range())
+        self.assertEqual(response.status_code, 200)
+        starts = [row['start_time'] for row in response.json()]
+        self.assertEqual(len(starts), 3)
+        self.assertEqual(starts, sorted(starts))
+
+    def test_enrollments_are_merged_by_slot_start_time(self):
+        response = self.get(self.student, 'enrollment', **self.full_range())
+        self.assertEqual(response.status_code, 200)
+        slots = [row['timeslot'] for row in response.json()]
+        starts = dict(TimeSlot.objects.values_list('id', 'start_time'))
+        starts.update(ArchivedTimeSlot.objects.values_list('id', 'start_time'))
+        self.assertEqual(len(slots), 3)
+        self.assertEqual([starts[slot] for slot in slots], sorted(starts[slot] for slot in slots))
+
+    def test_range_is_required_and_capped(self):
+        self.assertEqual(self.get(self.owner, 'timeslot').status_code, 400)
+        too_long = {'start_date': '2025-01-01', 'end_date': '2026-01-01'}
+        self.assertEqual(self.get(self.owner, 'timeslot', **too_long).status_code, 400)
+        self.assertEqual(self.get(self.student, 'enrollment', **too_long).status_code, 400)
+
+
+# -------------------------------------------------
+# CAMBIOS MASIVOS DE CONVOCATORIAS (bulk_update_slots)
+# -------------------------------------------------
+
+class BulkUpdateSlotsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('profe', is_staff=True)
+        cls.other = create_user('otro_profe', is_staff=True)
+        cls.student = create_user('alumno')
+        cls.activity = Activity.objects.create(owner=cls.owner, title='Conversación', description='')
+        cls.start = timezone.now() + timedelta(hours=2)
+        cls.slot = TimeSlot.objects.create(activity=cls.activity, start_time=cls.start, end_time=cls.start + timedelta(hours=1))
+        cls.enrollment = Enrollment.objects.create(user=cls.student, timeslot=cls.slot)
+
+    def post(self, user=None, activity_id=None, **data):
+        client = APIClient()
+        client.force_authenticate(user or self.owner)
+        day = f'{self.start:%Y-%m-%d}'
+        return client.post(
+            reverse('activity-bulk-update-slots', args=[activity_id or self.activity.id]),
+            {'start_date': day, 'end_date': day, **data},
+            format='json',
+        )
+
+    def test_shift_cannot_move_slots_into_the_past(self):
+        response = self.post(operation='shift', shift_minutes=-180)
+        self.assertEqual(response.status_code, 400)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.start_time, self.start)
+
+    def test_shift_moves_slots_of_the_whole_day(self):
+        # Las notificaciones (Redis y emails) van aparte: aquí solo comprobamos que se lanzan
+        with mock.patch('api.views.ActivityViewSet.notify_bulk_update') as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post(operation='shift', shift_minutes=60)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'], [self.slot.id])
+        notify.assert_called_once()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.start_time, self.start + timedelta(hours=1))
+
+    def test_cancel_deletes_slots_and_notifies_on_commit(self):
+        with mock.patch('api.views.ActivityViewSet.notify_bulk_update') as notify:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.post(operation='cancel')
+            # Hasta el commit no se notifica nada
+            notify.assert_not_called()
+            for callback in callbacks:
+                callback()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'], [self.slot.id])
+        self.assertEqual(response.json()['notified_users'], 1)
+        self.assertFalse(TimeSlot.objects.filter(id=self.slot.id).exists())
+        self.assertFalse(Enrollment.objects.filter(id=self.enrollment.id).exists())
+        notify.assert_called_once()
+        _, operation, slot_ids, affected, _ = notify.call_args.args
+        self.assertEqual((operation, slot_ids), ('cancel', [self.slot.id]))
+        self.assertEqual([row[0] for row in affected], [self.student.id])
+
+    def test_notification_errors_do_not_fail_the_request(self):
+        with mock.patch.object(room_cache, 'invalidate_rooms', side_effect=RuntimeError), \
+                mock.patch.object(notifications, 'enqueue', side_effect=OSError('SMTP caído')), \
+                mock.patch.object(events, 'emit_many') as emit_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post(operation='cancel')
+        self.assertEqual(response.status_code, 200)
+        # Cada paso se intenta aunque fallen los anteriores
+        emit_many.assert_called_once()
+
+    def test_invalid_input_is_rejected(self):
+        for weekdays in ([7], ['lunes'], 'lunes', [True]):
+            self.assertEqual(self.post(operation='cancel', weekdays=weekdays).status_code, 400)
+        self.assertEqual(self.post(operation='shift', shift_minutes='mucho').status_code, 400)
+        self.assertEqual(self.post(operation='cancel', start_date='ayer').status_code, 400)
+        self.assertTrue(TimeSlot.objects.filter(id=self.slot.id).exists())
+
+    def test_permission_and_missing_activity(self):
+        self.assertEqual(self.post(user=self.other, operation='cancel').status_code, 403)
+        self.assertEqual(self.post(activity_id=self.activity.id + 1000, operation='cancel').status_code, 404)
+        self.assertTrue(TimeSlot.objects.filter(id=self.slot.id).exists())
+
+
+# -------------------------------------------------
+# ACTIVIDADES (ActivityViewSet)
+# -------------------------------------------------
+
+class ActivityUpdateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('profe', is_staff=True)
+        cls.activity = Activity.objects.create(owner=cls.owner, title='Conversación', description='', max_participants=4)
+        now = timezone.now()
+        cls.soon = TimeSlot.objects.create(activity=cls.activity, start_time=now + timedelta(minutes=5), end_time=now + timedelta(hours=1))
+        # Fuera de la ventana de precarga: no puede estar en Redis
+        TimeSlot.objects.create(activity=cls.activity, start_time=now + timedelta(days=3), end_time=now + timedelta(days=3, hours=1))
+
+    def test_update_invalidates_prewarmed_rooms(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        with mock.patch.object(room_cache, 'invalidate_rooms') as invalidate_rooms:
+            response = client.patch(reverse('activity-detail', args=[self.activity.id]), {'max_participants': 6}, format='json')
+        self.assertEqual(response.status_code, 200)
+        invalidate_rooms.assert_called_once_with([self.soon.id])
+
+
+# -------------------------------------------------
+# ESTADÍSTICAS (api/stats.py)
+# -------------------------------------------------
+
+class StatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('profe', is_staff=True)
+        cls.student = create_user('alumno')
+        cls.activity = Activity.objects.create(owner=cls.owner, title='Conversación', description='', max_participants=4)
+        cls.other = Activity.objects.create(owner=cls.owner, title='Debate', description='', max_participants=4)
+        now = timezone.now()
+
+        # Viva terminada (con asistencia), viva futura y archivada (con una inscripción sin asistencia)
+        finished = TimeSlot.objects.create(activity=cls.activity, start_time=now - timedelta(hours=2), end_time=now - timedelta(hours=1))
+        Enrollment.objects.create(user=cls.student, timeslot=finished, attended=True)
+        cls.future = TimeSlot.objects.create(activity=cls.activity, start_time=now + timedelta(hours=1), end_time=now + timedelta(hours=2))
+        Enrollment.objects.create(user=cls.student, timeslot=cls.future)
+        archived = ArchivedTimeSlot.objects.create(
+            id=cls.future.id + 100, activity=cls.activity,
+            start_time=now - timedelta(days=100), end_time=now - timedelta(days=100) + timedelta(hours=1),
+        )
+        ArchivedEnrollment.objects.create(
+            id=Enrollment.objects.order_by('-id').first().id + 100,
+            user=cls.student, timeslot=archived, enrolled_at=archived.start_time,
+        )
+
+    def test_compute_stats_adds_archived_and_live(self):
+        stats = compute_stats([self.activity.id])[self.activity.id]
+        self.assertEqual(stats, {
+            'total_slots': 3,
+            'finished_slots': 2,
+            'capacity': 3 * 4,
+            'enrollments': 3,
+            'finished_enrollments': 2,
+            'attended': 1,
+        })
+
+    def test_refresh_creates_missing_rows_and_then_skips_clean_ones(self):
+        self.assertEqual(refresh_stats(), 2)
+        self.assertEqual(ActivityStats.objects.get(activity=self.activity).total_slots, 3)
+        self.assertFalse(ActivityStats.objects.filter(dirty=True).exists())
+        self.assertEqual(refresh_stats(), 0)
+
+    def test_refresh_only_dirty_activities(self):
+        refresh_stats()
+        ActivityStats.objects.filter(activity=self.activity).update(dirty=True)
+        self.assertEqual(refresh_stats(), 1)
+        self.assertFalse(ActivityStats.objects.get(activity=self.activity).dirty)
+
+    def test_refresh_activities_with_newly_finished_slots(self):
+        refresh_stats()
+        # La convocatoria futura termina después del último refresco
+        later = self.future.end_time + timedelta(minutes=1)
+        with mock.patch('api.stats.timezone.now', return_value=later):
+            self.assertEqual(refresh_stats(), 1)
+        self.assertEqual(ActivityStats.objects.get(activity=self.activity).finished_slots, 3)
+
+    def test_enrollment_marks_stats_dirty(self):
+        refresh_stats()
+        client = APIClient()
+        client.force_authenticate(self.student)
+        other_slot = TimeSlot.objects.create(
+            activity=self.other, start_time=self.future.start_time, end_time=self.future.end_time,
+        )
+        ActivityStats.objects.update(dirty=False)
+        with mock.patch.object(room_cache, 'add_room_user'), mock.patch.object(events, 'emit'):
+            response = client.post(reverse('enrollment-list'), {'user': self.student.id, 'timeslot': other_slot.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(ActivityStats.objects.filter(dirty=True).values_list('activity_id', flat=True)), [self.other.id])
+
+
+# -------------------------------------------------
+# COLA DE NOTIFICACIONES (api/notifications.py)
+# -------------------------------------------------
+
+class FakeRedis:
+    # Lo justo de Redis (listas y contadores) para probar la cola sin servidor
+    def __init__(self):
+        self.data = {}
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))  # solo se usa con 0, -1
+
+    def lmove(self, source, destination, where_from, where_to):
+        if not self.data.get(source):
+            return None
+        item = self.data[source].pop(0)
+        self.data.setdefault(destination, []).append(item)
+        return item
+
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+@override_settings(NOTIFICATIONS_BATCH_SIZE=10, NOTIFICATIONS_MAX_ATTEMPTS=2)
+class SendPendingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        get_sync_client = mock.patch.object(room_cache, 'get_sync_client', return_value=self.redis)
+        get_sync_client.start()
+        self.addCleanup(get_sync_client.stop)
+        notifications.enqueue([{'to': 'alumno@example.com', 'subject': 'Cambios', 'body': '¡Hola!'}])
+
+    def fail_to_send(self):
+        with mock.patch.object(notifications, '_send', side_effect=OSError('SMTP caído')):
+            with self.assertRaises(OSError):
+                notifications.send_pending()
+
+    def test_batch_is_sent_and_removed(self):
+        self.assertEqual(notifications.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(notifications.send_pending(), 0)
+
+    def test_failed_batch_is_retried(self):
+        self.fail_to_send()
+        # El lote sigue en proceso y el siguiente intento lo envía
+        self.assertEqual(len(self.redis.data[notifications.PROCESSING_KEY]), 1)
+        self.assertEqual(notifications.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertNotIn(notifications.PROCESSING_KEY, self.redis.data)
+        self.assertNotIn(notifications.ATTEMPTS_KEY, self.redis.data)
+
+    def test_batch_is_moved_to_failed_after_max_attempts(self):
+        self.fail_to_send()
+        self.fail_to_send()
+        self.assertEqual(notifications.send_pending(), 0)
+        self.assertEqual(len(self.redis.data[notifications.FAILED_KEY]), 1)
+        self.assertNotIn(notifications.PROCESSING_KEY, self.redis.data)
+        self.assertEqual(len(mail.outbox), 0)
+        # Y ya no bloquea la cola
+        notifications.enqueue([{'to': 'otro@example.com', 'subject': 'Cambios', 'body': '¡Hola!'}])
+        self.assertEqual(notifications.send_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, ['otro@example.com'])
@@ -1,21 +1,80 @@
-from django.shortcuts import render
-
-# Create your views here.
 # api/views.py
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User
 from rest_framework import viewsets
-from .models import User, Activity, TimeSlot, Enrollment
-from .serializers import UserSerializer, ActivitySerializer, TimeSlotSerializer, EnrollmentSerializer
+from .models import User, Activity, TimeSlot, Enrollment, ArchivedTimeSlot, ArchivedEnrollment, ActivityStats, Event
+from .serializers import (
+    UserSerializer, ActivitySerializer, TimeSlotSerializer, EnrollmentSerializer,
+    ArchivedTimeSlotSerializer, ArchivedEnrollmentSerializer, fast_serialize,
+)
 from . import permissions
+from .search import search_activities
+from .stats import compute_stats, stats_to_dict
+from . import events
+from . import notifications
+from . import room_cache
 from rest_framework.permissions import IsAuthenticated
-from zoneinfo import ZoneInfo
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import F, Q
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
 from datetime import datetime, time, timedelta
+import heapq
+
+
+def start_of_day(day):
+    """
+    Medianoche de `day` (en la zona horaria actual) como datetime con zona.
+    Para filtrar por fecha comparando `start_time` directamente: con
+    `start_time__date` la columna se convierte y no se puede usar un índice.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def history_range(params):
+    """
+    Rango obligatorio (?start_date=&end_date=, YYYY-MM-DD) de los endpoints de
+    histórico, de como mucho HISTORY_MAX_DAYS días. Devuelve (desde, hasta)
+    como datetimes con zona; `hasta` no está incluido.
+    """
+    try:
+        start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+    except KeyError as e:
+        raise ValidationError({'error': f'Falta el parámetro requerido: {e}'})
+    except ValueError as e:
+        raise ValidationError({'error': f'Filtro no válido: {e}'})
+
+    if not 0 <= (end_date - start_date).days < settings.HISTORY_MAX_DAYS:
+        raise ValidationError({'error': f'El rango de fechas debe ser de 1 a {settings.HISTORY_MAX_DAYS} días.'})
+    return start_of_day(start_date), start_of_day(end_date + timedelta(days=1))
+
+
+def merge_history(archived, live, key):
+    """
+    Junta las filas archivadas y las vivas (cada lista ya ordenada) en orden.
+    No basta con concatenarlas: si `archive_timeslots` se ejecuta con otro
+    --days, en la tabla viva quedan convocatorias más antiguas que las archivadas.
+    """
+    return list(heapq.merge(archived, live, key=key))
+
+
+class FastListMixin:
+    """
+    Para ViewSets con serializers planos: con ?fast=true el 'list' se sirve
+    con `fast_serialize` (mismo JSON, sin instanciar un objeto por fila).
+    Sin el parámetro, o con paginación, se usa el serializer normal.
+    """
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('fast') != 'true' or self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(fast_serialize(queryset, self.get_serializer_class()))
 
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
@@ -33,7 +92,8 @@ class ActivityViewSet(viewsets.ModelViewSet):
     - Solo Profesores/Admins pueden CREAR.
     - Solo el 'dueño' o Admin puede MODIFICAR/BORRAR.
     """
-    queryset = Activity.objects.all()
+    # `search_vector` solo lo usa la búsqueda (en SQL): no lo leemos
+    queryset = Activity.objects.defer('search_vector')
     serializer_class = ActivitySerializer
     permission_classes = [permissions.IsOwnerOrStaffReadOnly]
 
@@ -43,7 +103,85 @@ class ActivityViewSet(viewsets.ModelViewSet):
         como el 'owner' de la nueva actividad.
         """
         serializer.save(owner=self.request.user)
-    
+
+    def perform_update(self, serializer):
+        activity = serializer.save()
+        # Las salas precargadas guardan el título y `max_participants`: las que
+        # puede haber en Redis (sin terminar y dentro de la ventana de precarga) ya no valen
+        now = timezone.now()
+        room_cache.invalidate_rooms(list(
+            TimeSlot.objects.filter(
+                activity_id=activity.id,
+                end_time__gte=now,
+                start_time__lte=now + timedelta(minutes=settings.WAITING_ROOM_PREWARM_MINS),
+            ).values_list('id', flat=True)
+        ))
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        Panel de la actividad: convocatorias, ocupación, asistencia y no presentados.
+        Solo para el 'dueño' o un admin.
+
+        Se lee del resumen precalculado (ActivityStats). Si todavía no existe,
+        se calcula en vivo para esta actividad.
+        """
+        activity = self.get_object()
+        if not (request.user.is_superuser or activity.owner_id == request.user.id):
+            return Response({'error': 'Solo el dueño de la actividad puede ver sus estadísticas.'}, status=status.HTTP_403_FORBIDDEN)
+
+        summary = ActivityStats.objects.filter(activity_id=activity.id).values().first()
+        if summary is None:
+            values = compute_stats([activity.id])[activity.id]
+            refreshed_at = None
+        else:
+            values = summary
+            refreshed_at = summary['refreshed_at']
+
+        return Response({
+            'activity': activity.id,
+            **stats_to_dict(values),
+            'refreshed_at': refreshed_at,
+        })
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Búsqueda de actividades en el servidor (texto completo de PostgreSQL).
+
+        Parámetros (query string):
+        - q: texto a buscar en título y descripción (cada palabra como prefijo)
+        - upcoming=true: solo actividades con convocatorias futuras
+        - free_seats=true: solo actividades con plazas libres en alguna convocatoria futura
+        - limit: máximo de resultados (por defecto 20, máximo 100)
+
+        Las facetas solo se calculan si hay texto (si no, son null).
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            return Response({'error': 'El parámetro "limit" debe ser un número positivo.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, 100)
+
+        activities, facets = search_activities(
+            params.get('q', ''),
+            upcoming=params.get('upcoming') == 'true',
+            free_seats=params.get('free_seats') == 'true',
+        )
+        activities = activities.prefetch_related('files')[:limit]
+
+        return Response({
+            'count': facets['count'],
+            'facets': {
+                'has_upcoming_slots': facets['has_upcoming_slots'],
+                'has_free_seats': facets['has_free_seats'],
+            },
+            'results': ActivitySerializer(activities, many=True).data,
+        })
+
     @action(detail=True, methods=['post'])
     def create_bulk_slots(self, request, pk=None):
         """
@@ -102,6 +240,10 @@ class ActivityViewSet(viewsets.ModelViewSet):
                 # Avanzamos al siguiente día
                 current_date += timedelta(days=1)
 
+            # Las estadísticas se recalculan en el próximo refresco (una vez, no por convocatoria)
+            if slots_created:
+                ActivityStats.objects.filter(activity_id=activity.id).update(dirty=True)
+
             return Response(
                 {'message': f'{len(slots_created)} convocatorias creadas con éxito.', 'slots': slots_created},
                 status=status.HTTP_201_CREATED
@@ -112,23 +254,227 @@ class ActivityViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': f'Ha ocurrido un error: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def bulk_update_slots(self, request, pk=None):
+        """
+        Mueve o cancela en bloque las convocatorias futuras de esta actividad.
+
+        Espera un JSON con:
+        {
+            "start_date": "2025-11-01",
+            "end_date": "2025-11-30",
+            "weekdays": [0, 2, 4],      (opcional, 0=Lunes ... 6=Domingo)
+            "operation": "shift",       ("shift" o "cancel")
+            "shift_minutes": 60         (solo para "shift", puede ser negativo)
+        }
+        Todo se hace con un UPDATE/DELETE en una sola transacción, y los
+        inscritos afectados reciben un email (encolado, se envía en segundo plano).
+        """
+        # Fuera del `try`: sin permiso es un 403 y si no existe, un 404
+        activity = self.get_object()
 
-class TimeSlotViewSet(viewsets.ModelViewSet):
+        try:
+            # 1. Leer y validar los datos de entrada
+            data = request.data
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+            weekdays = data.get('weekdays')
+            operation = data['operation']
+
+            if weekdays is not None and not (
+                isinstance(weekdays, list)
+                and all(isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in weekdays)
+            ):
+                return Response(
+                    {'error': '"weekdays" debe ser una lista de enteros entre 0 (lunes) y 6 (domingo).'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if operation == 'shift':
+                shift = timedelta(minutes=int(data['shift_minutes']))
+                if not shift:
+                    return Response({'error': '"shift_minutes" no puede ser 0.'}, status=status.HTTP_400_BAD_REQUEST)
+            elif operation != 'cancel':
+                return Response({'error': 'La operación debe ser "shift" o "cancel".'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # 2. Convocatorias afectadas (solo las que no han empezado)
+            now = timezone.now()
+            slots = TimeSlot.objects.filter(
+                activity_id=activity.id,
+                start_time__gte=max(now, start_of_day(start_date)),
+                start_time__lt=start_of_day(end_date + timedelta(days=1)),
+            )
+            if weekdays:
+                # iso_week_day: 1=Lunes ... 7=Domingo
+                slots = slots.filter(start_time__iso_week_day__in=[day + 1 for day in weekdays])
+
+            with transaction.atomic():
+                slot_ids = list(slots.select_for_update().values_list('id', flat=True))
+                if not slot_ids:
+                    return Response({'message': '0 convocatorias afectadas.', 'slots': [], 'notified_users': 0})
+                # Al adelantarlas, ninguna puede quedar en el pasado
+                if operation == 'shift' and TimeSlot.objects.filter(id__in=slot_ids, start_time__lt=now - shift).exists():
+                    return Response(
+                        {'error': 'Con ese cambio alguna convocatoria quedaría en el pasado.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                affected = list(
+                    Enrollment.objects.filter(timeslot_id__in=slot_ids)
+                    .values_list('user_id', 'user__email', 'timeslot_id', 'timeslot__start_time')
+                    .order_by('user_id', 'timeslot__start_time')
+                )
+
+                # 3. Un solo UPDATE o DELETE para todas las convocatorias
+                if operation == 'shift':
+                    TimeSlot.objects.filter(id__in=slot_ids).update(
+                        start_time=F('start_time') + shift,
+                        end_time=F('end_time') + shift,
+                        # Con la nueva hora, el recordatorio se tiene que volver a enviar
+                        reminder_sent=False,
+                    )
+                else:
+                    # Sin señales en TimeSlot/Enrollment: un DELETE por tabla, sin cargar las filas
+                    Enrollment.objects.filter(timeslot_id__in=slot_ids).delete()
+                    TimeSlot.objects.filter(id__in=slot_ids).delete()
+
+                # Las estadísticas se recalculan en el próximo refresco
+                ActivityStats.objects.filter(activity_id=activity.id).update(dirty=True)
+
+                # 4. Al confirmar: salas precargadas, emails y eventos
+                transaction.on_commit(
+                    lambda: self.notify_bulk_update(activity, operation, slot_ids, affected, shift if operation == 'shift' else None)
+                )
+
+            verb = 'movidas' if operation == 'shift' else 'canceladas'
+            return Response({
+                'message': f'{len(slot_ids)} convocatorias {verb} con éxito.',
+                'slots': slot_ids,
+                'notified_users': len({user_id for user_id, *_ in affected}),
+            })
+
+        # Solo errores de los datos de entrada; el resto no es culpa del cliente
+        except KeyError as e:
+            return Response({'error': f'Falta el campo requerido: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError) as e:
+            return Response({'error': f'Datos no válidos: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def notify_bulk_update(self, activity, operation, slot_ids, affected, shift):
+        # Se ejecuta en `on_commit`: los cambios ya están guardados y la respuesta no
+        # puede fallar por esto. Cada paso se intenta aunque falle el anterior, y los
+        # errores solo se registran.
+        # Las salas precargadas de esas convocatorias ya no son válidas
+        try:
+            room_cache.invalidate_rooms(slot_ids)
+        except Exception as e:
+            print(f"    > ERROR al invalidar las salas de {len(slot_ids)} convocatorias: {e!r}")
+
+        # Un email por usuario, con todas sus convocatorias afectadas
+        lines_by_user = {}
+        for user_id, email, timeslot_id, start_time in affected:
+            old = start_time.strftime('%Y-%m-%d a las %H:%M UTC')
+            if operation == 'shift':
+                line = f'- {old} -> {(start_time + shift).strftime("%Y-%m-%d a las %H:%M UTC")}'
+            else:
+                line = f'- {old} (cancelada)'
+            lines_by_user.setdefault(email, []).append(line)
+
+        action_text = 'ha cambiado de horario' if operation == 'shift' else 'ha sido cancelada'
+        try:
+            # Si Redis falla, `enqueue` los envía directamente, y eso también puede fallar
+            notifications.enqueue([
+                {
+                    'to': email,
+                    'subject': f'Cambios en tu actividad "{activity.title}"',
+                    'body': (
+                        f'¡Hola!\n\n'
+                        f'Alguna de tus convocatorias de "{activity.title}" {action_text}:\n\n'
+                        + '\n'.join(lines)
+                    ),
+                }
+                for email, lines in lines_by_user.items()
+            ])
+        except Exception as e:
+            print(f"    > ERROR al notificar a {len(lines_by_user)} usuarios de '{activity.title}': {e!r}")
+
+        if operation == 'cancel':
+            try:
+                events.emit_many([
+                    events.build_entry(Event.UNENROLLED, user_id=user_id, timeslot_id=timeslot_id, reason='cancelled')
+                    for user_id, _, timeslot_id, _ in affected
+                ])
+            except Exception as e:
+                print(f"    > ERROR al registrar {len(affected)} bajas de '{activity.title}': {e!r}")
+
+
+class TimeSlotViewSet(FastListMixin, viewsets.ModelViewSet):
     """
-    Los permisos de TimeSlot se heredan de su Actividad.
-    Usamos el mismo permiso.
-    (Necesitaremos ajustar el modelo TimeSlot para que tenga un 'owner'
-    o comprobar el 'owner' de la actividad padre).
+    Los permisos de TimeSlot se heredan de su Actividad:
+    - Solo profesores/admins pueden ver y gestionar convocatorias.
+    - Solo el 'dueño' de la actividad (o un admin) puede MODIFICAR/BORRAR.
 
-    Por ahora, usaremos este permiso, pero lo ajustaremos.
+    TimeSlot no tiene 'owner', así que anotamos `owner_id` con el de la
+    actividad en la misma query (sin cargas extra para el permiso).
     """
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
-    # De momento, solo profesores/admins pueden gestionar convocatorias.
-    permission_classes = [permissions.IsStaffUser]
+    permission_classes = [permissions.IsStaffUser, permissions.IsOwnerOrStaffReadOnly]
+
+    def get_queryset(self):
+        return TimeSlot.objects.annotate(owner_id=F('activity__owner_id'))
 
+    def perform_create(self, serializer):
+        self.check_activity_owner(serializer.validated_data['activity'])
+        slot = serializer.save()
+        ActivityStats.objects.filter(activity_id=slot.activity_id).update(dirty=True)
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        if 'activity' in serializer.validated_data:
+            self.check_activity_owner(serializer.validated_data['activity'])
+        old_activity_id = serializer.instance.activity_id
+        slot = serializer.save()
+        # Si cambia de actividad, cambian las estadísticas de las dos
+        ActivityStats.objects.filter(activity_id__in={old_activity_id, slot.activity_id}).update(dirty=True)
+        # La sala precargada tiene la hora (o actividad) antigua
+        room_cache.invalidate_rooms([slot.id])
+
+    def perform_destroy(self, instance):
+        timeslot_id, activity_id = instance.id, instance.activity_id
+        # Sin señales en TimeSlot/Enrollment, las inscripciones se borran en cascada con un solo DELETE
+        instance.delete()
+        ActivityStats.objects.filter(activity_id=activity_id).update(dirty=True)
+        room_cache.invalidate_rooms([timeslot_id])
+
+    def check_activity_owner(self, activity):
+        # La actividad ya viene cargada por el serializer: solo comparamos IDs
+        user = self.request.user
+        if not user.is_superuser and activity.owner_id != user.id:
+            raise PermissionDenied('Solo el dueño de la actividad puede gestionar sus convocatorias.')
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Convocatorias ya terminadas: las archivadas y las que siguen en la tabla viva.
+        Parámetros: ?start_date=&end_date= (obligatorios) y ?activity=<id> (opcional)
+        """
+        since, until = history_range(request.query_params)
+        archived = ArchivedTimeSlot.objects.filter(start_time__gte=since, start_time__lt=until)
+        live = TimeSlot.objects.filter(start_time__gte=since, start_time__lt=until, end_time__lt=timezone.now())
+        if 'activity' in request.query_params:
+            try:
+                activity_id = int(request.query_params['activity'])
+            except ValueError:
+                return Response({'error': 'El parámetro "activity" debe ser un número.'}, status=status.HTTP_400_BAD_REQUEST)
+            archived = archived.filter(activity_id=activity_id)
+            live = live.filter(activity_id=activity_id)
+
+        return Response(merge_history(
+            fast_serialize(archived.order_by('start_time', 'id'), ArchivedTimeSlotSerializer),
+            fast_serialize(live.order_by('start_time', 'id'), TimeSlotSerializer),
+            key=lambda row: (parse_datetime(row['start_time']), row['id']),
+        ))
+
+
+class EnrollmentViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     - Alumnos solo pueden crear (inscribirse) y borrar sus propias inscripciones.
     - Profesores/Admins pueden ver y gestionar todas las inscripciones.
@@ -137,6 +483,87 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        """
+        Cada usuario solo ve sus filas:
+        - Admin: todas.
+        - Profesor: las suyas y las de las actividades de las que es 'owner'.
+        - Alumno: solo las suyas.
+
+        Filtros opcionales (query string):
+        - timeslot: ID de la convocatoria
+        - start_date / end_date: rango (YYYY-MM-DD) sobre el inicio de la convocatoria
+        """
+        return self.scope_enrollments(Enrollment.objects.all())
+
+    def scope_enrollments(self, queryset):
+        # Aplica los permisos por rol y los filtros de `get_queryset`.
+        # Sirve también para ArchivedEnrollment (tiene los mismos campos).
+        user = self.request.user
+
+        if not user.is_superuser:
+            if user.is_staff:
+                queryset = queryset.filter(Q(user_id=user.id) | Q(timeslot__activity__owner_id=user.id))
+            else:
+                queryset = queryset.filter(user_id=user.id)
+
+        params = self.request.query_params
+        try:
+            if 'timeslot' in params:
+                queryset = queryset.filter(timeslot_id=int(params['timeslot']))
+            if 'start_date' in params:
+                start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+                queryset = queryset.filter(timeslot__start_time__gte=start_of_day(start_date))
+            if 'end_date' in params:
+                end_date = datetime.strptime(params['end_date'], '%Y-%m-%d').date()
+                queryset = queryset.filter(timeslot__start_time__lt=start_of_day(end_date + timedelta(days=1)))
+        except ValueError as e:
+            raise ValidationError({'error': f'Filtro no válido: {e}'})
+
+        # Orden estable por (timeslot_id, user_id): con ?timeslot= lo resuelve
+        # el índice (timeslot, attended) y el desempate por usuario es pequeño
+        return queryset.order_by('timeslot_id', 'user_id')
+
+    def perform_create(self, serializer):
+        enrollment = serializer.save()
+        # Un UPDATE (con JOIN) sin cargar la convocatoria; se recalculan en el próximo refresco
+        ActivityStats.objects.filter(activity__timeslots__id=enrollment.timeslot_id).update(dirty=True)
+        # Si la sala ya está precargada, el nuevo inscrito tiene que estar en ella
+        room_cache.add_room_user(enrollment.timeslot_id, enrollment.user_id)
+        # El histórico se escribe en segundo plano (ver api/events.py)
+        events.emit(Event.ENROLLED, user_id=enrollment.user_id, timeslot_id=enrollment.timeslot_id)
+
+    def perform_destroy(self, instance):
+        user_id, timeslot_id = instance.user_id, instance.timeslot_id
+        instance.delete()
+        ActivityStats.objects.filter(activity__timeslots__id=timeslot_id).update(dirty=True)
+        room_cache.remove_room_user(timeslot_id, user_id)
+        events.emit(Event.UNENROLLED, user_id=user_id, timeslot_id=timeslot_id)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Inscripciones en convocatorias ya terminadas (archivadas y vivas),
+        con los mismos permisos y filtros que el listado normal.
+        Aquí ?start_date=&end_date= son obligatorios (ver `history_range`).
+        """
+        history_range(request.query_params)
+        archived = self.scope_enrollments(ArchivedEnrollment.objects.all())
+        live = self.scope_enrollments(Enrollment.objects.filter(timeslot__end_time__lt=timezone.now()))
+        order = ('timeslot__start_time', 'timeslot_id', 'user_id')
+
+        # Hora de inicio de cada convocatoria, para ordenar la mezcla.
+        # (Las archivadas conservan su ID, así que no coinciden con las vivas.)
+        starts = {}
+        for queryset in (archived, live):
+            starts.update(queryset.order_by().values_list('timeslot_id', 'timeslot__start_time').distinct())
+
+        return Response(merge_history(
+            fast_serialize(archived.order_by(*order), ArchivedEnrollmentSerializer),
+            fast_serialize(live.order_by(*order), EnrollmentSerializer),
+            key=lambda row: (starts[row['timeslot']], row['timeslot'], row['user']),
+        ))
+
 
 class EdxLoginView(APIView):
     """
@@ -9,18 +9,36 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+import django
+from django.conf import settings
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import api.routing
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+# Inicializamos Django ANTES de importar nada que use modelos (api.routing -> consumers).
+# Los workers de solo websockets (TALKABOUT_PROCESS_ROLE=websocket) no montan la parte HTTP.
+if settings.PROCESS_ROLE == "websocket":
+    django.setup(set_prefix=False)
+    http_application = None
+else:
+    http_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from api.middleware import JWTAuthMiddleware  # noqa: E402
+import api.routing  # noqa: E402
+
+protocols = {
+    # La sesión de Django (AuthMiddlewareStack) y, si viene ?token=, el JWT de la API
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            api.routing.websocket_urlpatterns
+        JWTAuthMiddleware(
+            URLRouter(
+                api.routing.websocket_urlpatterns
+            )
         )
     ),
-})
+}
+if http_application is not None:
+    protocols["http"] = http_application
+
+application = ProtocolTypeRouter(protocols)
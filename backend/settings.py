@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     # apps de terceros
     "rest_framework",
@@ -50,6 +52,34 @@ INSTALLED_APPS = [
     "api",
 ]
 
+# --- PERFIL DEL PROCESO ---
+# Cada tipo de proceso carga solo las apps que necesita (menos imports al arrancar):
+# - "api": API REST (WSGI) y admin
+# - "websocket": salas de espera (ASGI/Channels, sin HTTP)
+# - "cron": `manage.py runcrons` y los comandos de mantenimiento
+# - "all" (por defecto): todo, como en desarrollo
+# Ej: TALKABOUT_PROCESS_ROLE=cron python manage.py runcrons
+PROCESS_ROLE = os.environ.get("TALKABOUT_PROCESS_ROLE", "all")
+
+_APPS_NOT_NEEDED = {
+    "api": {"channels", "django_cron"},
+    "websocket": {
+        "django.contrib.admin", "django.contrib.messages", "django.contrib.staticfiles",
+        "rest_framework", "rest_framework_simplejwt", "django_cron",
+    },
+    "cron": {
+        "channels", "django.contrib.admin", "django.contrib.sessions", "django.contrib.messages",
+        "django.contrib.staticfiles", "rest_framework", "rest_framework_simplejwt",
+    },
+}
+if PROCESS_ROLE != "all" and PROCESS_ROLE not in _APPS_NOT_NEEDED:
+    # Mejor fallar al arrancar que cargar en silencio el perfil "all"
+    raise ImproperlyConfigured(
+        f'TALKABOUT_PROCESS_ROLE="{PROCESS_ROLE}" no es válido. '
+        f'Valores posibles: all, {", ".join(_APPS_NOT_NEEDED)}.'
+    )
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in _APPS_NOT_NEEDED.get(PROCESS_ROLE, set())]
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -144,8 +174,17 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Modo "sharded" del cron de recordatorios: con N nodos, cada uno se encarga
+# de las convocatorias con id % REMINDER_CRON_SHARDS == REMINDER_CRON_SHARD_INDEX.
+# Con 1 (por defecto) un único nodo hace todo el trabajo.
+REMINDER_CRON_SHARDS = int(os.environ.get("REMINDER_CRON_SHARDS", 1))
+REMINDER_CRON_SHARD_INDEX = int(os.environ.get("REMINDER_CRON_SHARD_INDEX", 0))
+
 CRON_CLASSES = [
     'api.cron.SendReminderCronJob', # Ruta a nuestra clase
+    'api.cron.PrewarmWaitingRoomsCronJob',
+    'api.cron.RefreshActivityStatsCronJob',
+    'api.cron.SendNotificationsCronJob',
 ]
 
 # --- CONFIGURACIÓN DE EMAIL ---
@@ -153,6 +192,14 @@ EMAIL_BACKEND = "sendgrid_backend.SendgridBackend"
 SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY")
 SENDGRID_SANDBOX_MODE_IN_DEBUG = False
 DEFAULT_FROM_EMAIL = 'imarest3@upv.edu.es'
+# Emails que se envían por cada conexión en `SendNotificationsCronJob`.
+NOTIFICATIONS_BATCH_SIZE = 100
+# Intentos de envío de un lote antes de apartarlo (ver api/notifications.py).
+NOTIFICATIONS_MAX_ATTEMPTS = 5
+
+# --- CONFIGURACIÓN DE REDIS ---
+REDIS_HOST = os.environ.get("REDIS_HOST", '127.0.0.1')
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 
 # --- CONFIGURACIÓN DE CHANNELS ---
 ASGI_APPLICATION = 'backend.asgi.application'
@@ -160,7 +207,40 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
-}
\ No newline at end of file
+}
+
+# --- CONFIGURACIÓN DEL HISTÓRICO DE EVENTOS ---
+# Los eventos se encolan en un stream de Redis y `manage.py flush_events` los vuelca a la BBDD.
+# Tamaño máximo (aproximado) del stream. OJO: al recortar, Redis descarta los más
+# antiguos aunque el worker no los haya volcado todavía (se pierden). Tiene que dar
+# margen para varias horas de eventos con el worker parado.
+EVENT_STREAM_MAXLEN = 1000000
+# Cada cuántos milisegundos (como mucho) se vuelca un lote, y tamaño máximo del lote.
+EVENT_FLUSH_INTERVAL_MS = 5000
+EVENT_FLUSH_BATCH_SIZE = 1000
+
+# --- ARCHIVO DE CONVOCATORIAS ---
+# Días que una convocatoria terminada se queda en las tablas vivas antes de
+# que `manage.py archive_timeslots` la mueva al histórico.
+ARCHIVE_RETENTION_DAYS = 90
+# Rango máximo (en días) que se puede pedir de una vez a los endpoints de histórico.
+HISTORY_MAX_DAYS = 92
+
+# --- CONFIGURACIÓN DE LA SALA DE ESPERA ---
+# Segundos de cuenta atrás antes de lanzar la llamada.
+WAITING_ROOM_WAIT_SECONDS = 10
+# Minutos de antelación con los que se precargan las salas en Redis.
+WAITING_ROOM_PREWARM_MINS = 15
+# Cada cuántos segundos enviamos un 'ping' al cliente.
+WAITING_ROOM_HEARTBEAT_SECONDS = 20
+# Si en este tiempo no recibimos nada del cliente, cerramos la conexión.
+WAITING_ROOM_IDLE_TIMEOUT_SECONDS = 60
+# Límite de mensajes entrantes por conexión (token bucket).
+WAITING_ROOM_INBOUND_RATE = 1  # mensajes por segundo
+WAITING_ROOM_INBOUND_BURST = 5
+WAITING_ROOM_MAX_MESSAGE_BYTES = 1024
+# Máximo de mensajes pendientes de enviar a un cliente antes de desconectarlo por lento.
+WAITING_ROOM_MAX_PENDING_SENDS = 50
\ No newline at end of file